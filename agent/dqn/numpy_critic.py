@@ -0,0 +1,88 @@
+# -*- coding:utf-8  -*-
+import os
+
+import numpy as np
+
+# The Critic MLP evaluated with numpy matmuls, so an agent can play a trained model
+# without importing torch.  Weights come from a .npz written by DQN.export_numpy
+# (the state dict as float32 arrays: linear1.weight, linear1.bias, linear2.weight, ...);
+# every layer but the last is followed by a ReLU.
+#
+# An int8 .npz (agent/dqn/quantize.py) holds the quantized weight matrices as int8
+# with a float32 scale per output row, linearN.scale, and weight = int8 * scale.
+# The weights are dequantized to float32 when loaded, so int8 only makes the file
+# smaller: inference runs the same float32 matmuls and is no faster.
+
+
+def quantize_weights(weights, layers=None):
+    # symmetric int8 per output row of the weights of layers (names such as linear2), all by default
+    quantized = {}
+    for key, value in weights.items():
+        value = np.asarray(value, dtype=np.float32)
+        if key.endswith('.weight') and (layers is None or key[:-len('.weight')] in layers):
+            scale = np.abs(value).max(axis=1) / 127
+            scale[scale == 0] = 1
+            quantized[key] = np.clip(np.rint(value / scale[:, None]), -127, 127).astype(np.int8)
+            quantized[key[:-len('weight')] + 'scale'] = scale.astype(np.float32)
+        else:
+            quantized[key] = value
+    return quantized
+
+
+def dequantize_weights(weights):
+    weights = dict(weights)
+    for key in [k for k in weights if k.endswith('.scale')]:
+        name = key[:-len('scale')] + 'weight'
+        weights[name] = weights[name].astype(np.float32) * weights.pop(key)[:, None]
+    return {k: np.asarray(v, dtype=np.float32) for k, v in weights.items()}
+
+
+def load_weights(file):
+    # float32 state dict of a float32 or int8 .npz
+    with np.load(file) as weights:
+        if any(k.endswith('.scale') for k in weights.files):
+            print("%s: int8 weights are dequantized to float32, a smaller file but no faster inference"
+                  % os.path.basename(file))
+        return dequantize_weights(weights)
+
+
+class NumpyCritic(object):
+    """
+    The Critic forward pass on a float32 or int8 state dict.  int8 weights are
+    dequantized to float32 here, at load: a smaller file, no inference speedup.
+    """
+
+    def __init__(self, weights):
+        weights = dequantize_weights(weights)
+        n_layers = len([k for k in weights if k.endswith('.weight')])
+        # transposed once so that a forward pass is x @ w + b
+        self.layers = [(np.ascontiguousarray(weights['linear%d.weight' % i], dtype=np.float32).T,
+                        np.asarray(weights['linear%d.bias' % i], dtype=np.float32))
+                       for i in range(1, n_layers + 1)]
+        self.input_size = self.layers[0][0].shape[0]
+        self.output_size = self.layers[-1][0].shape[1]
+
+    @classmethod
+    def load(cls, file):
+        return cls(load_weights(file))
+
+    def forward(self, x):
+        x = np.asarray(x, dtype=np.float32).reshape(-1, self.input_size)
+        for w, b in self.layers[:-1]:
+            x = x @ w
+            x += b
+            np.maximum(x, 0, out=x)
+        w, b = self.layers[-1]
+        return x @ w + b
+
+    def choose_action(self, observation):
+        return int(np.argmax(self.forward(observation)[0]))
+
+    def choose_actions(self, observations):
+        # greedy actions of a batch of observations
+        return np.argmax(self.forward(observations), axis=1).tolist()
+
+
+def load_critic(file):
+    base_path = os.path.dirname(os.path.abspath(__file__))
+    return NumpyCritic.load(os.path.join(base_path, file))
@@ -0,0 +1,184 @@
+# -*- coding:utf-8  -*-
+# Observation features of the DQN agent.  Kept free of torch so that evaluation and
+# the search agents can build observations without importing it.
+
+import numpy as np
+import math
+
+def get_surrounding(state, width, height, x, y):
+    surrounding = [state[(y - 1) % height][x],  # up
+                   state[(y + 1) % height][x],  # down
+                   state[y][(x - 1) % width],  # left
+                   state[y][(x + 1) % width]]  # right
+
+    return surrounding
+
+def get_surrounding_3(state, width, height, x, y):
+    surrounding = [state[(y - 1) % height][(x - 1) % width], 
+                   state[(y - 1) % height][x],
+                   state[(y - 1) % height][(x + 1) % width], 
+                   state[(y + 1) % height][(x - 1) % width], 
+                   state[(y + 1) % height][x],
+                   state[(y + 1) % height][(x + 1) % width],  
+                   state[y][(x - 1) % width],  
+                   state[y][(x + 1) % width],
+                   state[y][(x - 2) % width],
+                   state[y][(x + 2) % width],
+                   state[(y - 2) % height][x],
+                   state[(y + 2) % height][x]]
+
+    return surrounding
+
+
+def diji(state, X, Y, width, height):
+    mp=np.zeros((height,width))
+    for i in range(height):
+        for j in range(width):
+            mp[i][j]=math.inf
+    mp[X][Y]=0
+    vis=np.zeros((height,width))
+    from queue import PriorityQueue as PQ
+    pq=PQ()
+    pq.put((0,(X,Y)))
+    dx = [-1,1,0,0]
+    dy = [0,0,-1,1]
+    while (not pq.empty()):
+        (d, (x,y)) =pq.get()
+        if (vis[x][y]==1): continue
+        vis[x][y] = 1
+        for i in range(4):
+            x1=x+dx[i]
+            y1=y+dy[i]
+            x1 += height
+            x1 %= height
+            y1 += width
+            y1 %= width
+            if (state[x1][y1]==2 or state[x1][y1]==3): continue
+            if (mp[x1][y1]>mp[x][y]+1):
+                mp[x1][y1]=mp[x][y]+1
+                pq.put((mp[x1][y1],(x1,y1)))
+    return mp
+
+def get_min_bean(x, y, beans_position, width, height, snakes, state):
+    min_distance = math.inf
+    min_x = beans_position[0][1]
+    min_y = beans_position[0][0]
+    index = 0
+    Ux = snakes[0][0][1]
+    Uy = snakes[0][0][0]
+    id = 1
+    if (Ux== x and Uy==y):
+        Ux = snakes[1][0][1]
+        Uy = snakes[1][0][0]
+        id = 0
+    mat = diji(state,y,x,width, height)
+    matU= diji(state,Uy, Ux, width,height)
+    for i, (bean_y, bean_x) in enumerate(beans_position):
+        # distance = math.sqrt((x - bean_x) ** 2 + (y - bean_y) ** 2)
+        distance_my = mat[bean_y][bean_x]
+        distance_U = matU[bean_y][bean_x]
+        if (len(snakes[id])+1<=len(snakes[id^1])):
+            distance = distance_my
+        else:
+            if (distance_U == math.inf and distance_my == math.inf):
+                distance = math.inf
+            elif (distance_my == math.inf):
+                    distance = math.inf
+            elif (distance_U == math.inf):
+                distance = distance_my *0.6
+            elif (distance_U == distance_my == 1):
+                distance = math.inf
+            else:
+                distance = 0.9*distance_my-0.1*distance_U
+        # snake_id = get_id(y, x, width)
+        # beans_id = get_id(bean_y, bean_x, width)
+        # distance = mat[snake_id][beans_id]
+        if distance < min_distance:
+            min_x = bean_x
+            min_y = bean_y
+            min_distance = distance
+            index = i
+    return min_x, min_y, index
+
+# Self position:        0:head_x; 1:head_y
+# Head surroundings:    2:head_up; 3:head_down; 4:head_left; 5:head_right
+# Beans positions:      (6, 7) (8, 9) (10, 11) (12, 13) (14, 15)
+# Other snake positions: (16, 17) -- (other_x - self_x, other_y - self_y)
+def get_observations(state, info, agents_index, obs_dim, height, width, step):
+    state = np.array(state)
+    state = np.squeeze(state, axis=2)
+    observations = np.zeros((len(agents_index), obs_dim))
+    snakes_position = np.array(info['snakes_position'], dtype=object)
+    # beans_position = np.array(info['beans_position']).flatten()
+    beans_position = np.array(info['beans_position'])
+    for i in agents_index:
+        # self head position
+        observations[i][:2] = snakes_position[i][0][:]
+
+        # head surroundings
+        head_x = snakes_position[i][0][1]
+        head_y = snakes_position[i][0][0]
+        head_surrounding = get_surrounding_3(state, width, height, head_x, head_y)
+        observations[i][2:14] = head_surrounding[:]
+        # observations[i][14:16] = [head_x, head_y]
+        observations[i][14:16] = [snakes_position[i][1][1],  snakes_position[i][1][0]]
+        observations[i][16:18] = [snakes_position[i][-1][1],  snakes_position[i][-1][0]]
+
+        head_x_U = snakes_position[i ^ 1][0][1]
+        head_y_U = snakes_position[i ^ 1][0][0]
+        head_surrounding = get_surrounding_3(state, width, height, head_x_U, head_y_U)
+        observations[i][18:30] = head_surrounding[:]
+        # observations[i][32:34] = [head_x_U, head_y_U]
+        observations[i][30:32] = [snakes_position[i^1][1][1],  snakes_position[i^1][1][0]]
+        observations[i][32:34] = [snakes_position[i^1][-1][1],  snakes_position[i^1][-1][0]]
+        # other snake positions
+        snake_heads = [snake[0] for snake in snakes_position]
+        snake_heads = np.array(snake_heads[1:])
+        snake_heads -= snakes_position[i][0]
+        observations[i][34:36] = snake_heads.flatten()[:]
+        observations[i][36:38] = [len(snake) for snake in snakes_position]
+
+        observations[i][38] = step
+        # beans positions
+        beans = beans_position.flatten()
+        beans_len = len(beans)
+        observations[i][39 : 39 + beans_len] = beans[:]
+        if (beans_len < 10) : observations[i][39 + beans_len:] = 0
+        for j, (beans_y, beans_x) in enumerate(beans_position):
+            dis_my = min(abs(head_y - beans_y), abs(head_y + beans_y + 2 - height)) + min(abs(head_x - beans_x), abs(head_x + beans_x + 2 - width))
+            dis_U = min(abs(head_y_U - beans_y), abs(head_y_U + beans_y + 2 - height)) + min(abs(head_x_U - beans_x), abs(head_x_U + beans_x + 2 - width))
+            observations[i][49 + 2 * j - 2] = dis_my
+            observations[i][49 + 2 * j - 1] = dis_U
+        if (beans_len < 10) : observations[i][49 + beans_len:] = 0
+        observations[i][59:62] = get_min_bean(head_x, head_y, beans_position, width, height, snakes_position, state)
+        observations[i][62:65] = get_min_bean(head_x_U, head_y_U, beans_position, width, height, snakes_position, state)
+    return observations
+
+
+def torus_distance(a, b, height, width):
+    dx = abs(a[0] - b[0]) % height
+    dy = abs(a[1] - b[1]) % width
+    return min(dx, height - dx) + min(dy, width - dy)
+
+
+def controlled_observations(observation_list, step, obs_dim=65):
+    # One feature row per controlled snake, the snake seen as snake 0 of a 1v1 game (how
+    # the critic was trained) against the nearest head of a snake the policy does not
+    # control, or of any other snake when it controls them all.  The other snakes'
+    # cells are marked as the opponent's.
+    # controlled_snake_index counts from 0, the snakes' keys from 2
+    controlled = [obs['controlled_snake_index'] + 2 for obs in observation_list]
+    observations = np.zeros((len(observation_list), obs_dim))
+    for n, obs in enumerate(observation_list):
+        height, width = obs['board_height'], obs['board_width']
+        me = obs['controlled_snake_index'] + 2
+        snakes = [k for k in obs if isinstance(k, int) and k >= 2]
+        others = [k for k in snakes if k not in controlled] or [k for k in snakes if k != me]
+        opponent = min(others, key=lambda k: torus_distance(obs[k][0], obs[me][0], height, width))
+        state = np.squeeze(np.array(obs['state_map']), axis=2)
+        state = np.where(state >= 2, 3, state)
+        for x, y in obs[me]:
+            state[x][y] = 2
+        info = {"beans_position": obs[1], "snakes_position": [obs[me], obs[opponent]]}
+        observations[n] = get_observations(state[:, :, None], info, [0], obs_dim, height, width, step)[0]
+    return observations
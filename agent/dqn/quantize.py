@@ -0,0 +1,102 @@
+# -*- coding:utf-8  -*-
+import argparse
+import os
+
+import numpy as np
+import torch
+
+from agent.dqn.numpy_critic import NumpyCritic, quantize_weights
+from agent.dqn.observation import get_observations
+from env.chooseenv import make
+
+# Compresses a trained critic_*.pth to int8 (critic_*_int8.npz) and checks it against
+# the float32 model on recorded states before writing it: the greedy action must
+# agree on at least min_agreement of the states.  The states are a .npy of
+# observation rows, or the 65 features of get_observations recorded from games
+# the float32 critic plays against a random snake.
+#
+# By default only the hidden layers are quantized.  The first layer sees raw
+# coordinates and the step count and the last one turns a few hundred units into
+# Q values a couple of units apart; in int8 either one alone changes the greedy
+# action of critic_5000 on 3.7% (first) and 6.9% (last) of the recorded states,
+# while the hidden layer, three quarters of the weights, changes 1.25%.
+#
+# int8 is a storage format only: NumpyCritic dequantizes it to float32 at load and
+# runs the same matmuls, so inference is no faster, and the greedy action still
+# differs on 1.25% of the states.  numpy has no int8 GEMM; its integer matmuls are
+# about 12x slower than float32 for one observation and 50x for a batch of 64.
+# Play the float32 critic_*.npz unless the file size matters.
+#
+#   python -m agent.dqn.quantize agent/dqn/critic_5000.pth
+
+
+def record_states(critic, n_games=20, seed=0):
+    env = make('snakes_1v1')
+    rng = np.random.RandomState(seed)
+    states = []
+    for game in range(n_games):
+        state, info = env.reset(seed=seed + game)
+        step = 0
+        while True:
+            obs = get_observations(state, info, [0, 1], 65, env.board_height, env.board_width, step)
+            states.append(obs)
+            actions = [critic.choose_action(obs[0]), rng.randint(4)]
+            state, _, done, _, info = env.step(env.encode(actions))
+            step += 1
+            if done:
+                break
+    return np.concatenate(states).astype(np.float32)
+
+
+def check_accuracy(critic, quantized, states):
+    q, q8 = critic.forward(states), quantized.forward(states)
+    return {"states": len(states), "agreement": float((q.argmax(1) == q8.argmax(1)).mean()),
+            "max_q_error": float(np.abs(q - q8).max()), "mean_q_error": float(np.abs(q - q8).mean())}
+
+
+def hidden_layers(weights):
+    names = [k[:-len('.weight')] for k in weights if k.endswith('.weight')]
+    return sorted(names, key=lambda name: int(name[len('linear'):]))[1:-1]
+
+
+def quantize_checkpoint(file, out=None, states=None, n_games=20, min_agreement=0.98, layers=None):
+    weights = {k: v.detach().cpu().numpy() for k, v in torch.load(file, map_location='cpu').items()}
+    layers = hidden_layers(weights) if layers is None else layers
+    if not layers:
+        raise Exception("%s has no hidden layer, name the layers to quantize" % file)
+    quantized = quantize_weights(weights, layers)
+    critic, critic8 = NumpyCritic(weights), NumpyCritic(quantized)
+    if states is None:
+        if critic.input_size != 65:
+            raise Exception("%s takes %d inputs, pass recorded states of that size" % (file, critic.input_size))
+        states = record_states(critic, n_games)
+    report = check_accuracy(critic, critic8, states)
+    if report["agreement"] < min_agreement:
+        raise Exception("int8 model agrees on %.4f of the states, less than %.4f" % (report["agreement"], min_agreement))
+    out = out or os.path.splitext(file)[0] + '_int8.npz'
+    np.savez(out, **quantized)
+    report["file"] = out
+    report["size"] = os.path.getsize(out)
+    report["float_size"] = os.path.getsize(file)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compress a critic to int8 weights for a smaller file. The weights are dequantized to "
+                    "float32 when loaded, so inference is not faster, and the greedy action can differ from "
+                    "the float32 critic's on a few states (see --min_agreement).")
+    parser.add_argument("checkpoint", help="critic_*.pth")
+    parser.add_argument("--out", default=None, help="defaults to <checkpoint>_int8.npz")
+    parser.add_argument("--states", default=None, help=".npy of observation rows to check on")
+    parser.add_argument("--games", default=20, type=int, help="games to record states from")
+    parser.add_argument("--min_agreement", default=0.98, type=float,
+                        help="smallest share of states on which the greedy action must agree")
+    parser.add_argument("--layers", default=None, help="comma separated layers to quantize, the hidden ones by default")
+    args = parser.parse_args()
+    states = None if args.states is None else np.load(args.states).astype(np.float32)
+    layers = None if args.layers is None else args.layers.split(',')
+    report = quantize_checkpoint(args.checkpoint, args.out, states, args.games, args.min_agreement, layers)
+    print("%s: %d -> %d bytes, greedy action agrees on %.2f%% of %d states, max Q error %.4f" % (
+        report["file"], report["float_size"], report["size"], 100 * report["agreement"], report["states"],
+        report["max_q_error"]))
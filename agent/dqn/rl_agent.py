@@ -8,156 +8,9 @@ import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import random
-import math
 
-def get_surrounding(state, width, height, x, y):
-    surrounding = [state[(y - 1) % height][x],  # up
-                   state[(y + 1) % height][x],  # down
-                   state[y][(x - 1) % width],  # left
-                   state[y][(x + 1) % width]]  # right
-
-    return surrounding
-
-def get_surrounding_3(state, width, height, x, y):
-    surrounding = [state[(y - 1) % height][(x - 1) % width], 
-                   state[(y - 1) % height][x],
-                   state[(y - 1) % height][(x + 1) % width], 
-                   state[(y + 1) % height][(x - 1) % width], 
-                   state[(y + 1) % height][x],
-                   state[(y + 1) % height][(x + 1) % width],  
-                   state[y][(x - 1) % width],  
-                   state[y][(x + 1) % width],
-                   state[y][(x - 2) % width],
-                   state[y][(x + 2) % width],
-                   state[(y - 2) % height][x],
-                   state[(y + 2) % height][x]]
-
-    return surrounding
-
-
-def diji(state, X, Y, width, height):
-    mp=np.zeros((height,width))
-    for i in range(height):
-        for j in range(width):
-            mp[i][j]=math.inf
-    mp[X][Y]=0
-    vis=np.zeros((height,width))
-    from queue import PriorityQueue as PQ
-    pq=PQ()
-    pq.put((0,(X,Y)))
-    dx = [-1,1,0,0]
-    dy = [0,0,-1,1]
-    while (not pq.empty()):
-        (d, (x,y)) =pq.get()
-        if (vis[x][y]==1): continue
-        vis[x][y] = 1
-        for i in range(4):
-            x1=x+dx[i]
-            y1=y+dy[i]
-            x1 += height
-            x1 %= height
-            y1 += width
-            y1 %= width
-            if (state[x1][y1]==2 or state[x1][y1]==3): continue
-            if (mp[x1][y1]>mp[x][y]+1):
-                mp[x1][y1]=mp[x][y]+1
-                pq.put((mp[x1][y1],(x1,y1)))
-    return mp
-
-def get_min_bean(x, y, beans_position, width, height, snakes, state):
-    min_distance = math.inf
-    min_x = beans_position[0][1]
-    min_y = beans_position[0][0]
-    index = 0
-    Ux = snakes[0][0][1]
-    Uy = snakes[0][0][0]
-    id = 1
-    if (Ux== x and Uy==y):
-        Ux = snakes[1][0][1]
-        Uy = snakes[1][0][0]
-        id = 0
-    mat = diji(state,y,x,width, height)
-    matU= diji(state,Uy, Ux, width,height)
-    for i, (bean_y, bean_x) in enumerate(beans_position):
-        # distance = math.sqrt((x - bean_x) ** 2 + (y - bean_y) ** 2)
-        distance_my = mat[bean_y][bean_x]
-        distance_U = matU[bean_y][bean_x]
-        if (len(snakes[id])+1<=len(snakes[id^1])):
-            distance = distance_my
-        else:
-            if (distance_U == math.inf and distance_my == math.inf):
-                distance = math.inf
-            elif (distance_my == math.inf):
-                    distance = math.inf
-            elif (distance_U == math.inf):
-                distance = distance_my *0.6
-            elif (distance_U == distance_my == 1):
-                distance = math.inf
-            else:
-                distance = 0.9*distance_my-0.1*distance_U
-        # snake_id = get_id(y, x, width)
-        # beans_id = get_id(bean_y, bean_x, width)
-        # distance = mat[snake_id][beans_id]
-        if distance < min_distance:
-            min_x = bean_x
-            min_y = bean_y
-            min_distance = distance
-            index = i
-    return min_x, min_y, index
-
-# Self position:        0:head_x; 1:head_y
-# Head surroundings:    2:head_up; 3:head_down; 4:head_left; 5:head_right
-# Beans positions:      (6, 7) (8, 9) (10, 11) (12, 13) (14, 15)
-# Other snake positions: (16, 17) -- (other_x - self_x, other_y - self_y)
-def get_observations(state, info, agents_index, obs_dim, height, width, step):
-    state = np.array(state)
-    state = np.squeeze(state, axis=2)
-    observations = np.zeros((len(agents_index), obs_dim))
-    snakes_position = np.array(info['snakes_position'], dtype=object)
-    # beans_position = np.array(info['beans_position']).flatten()
-    beans_position = np.array(info['beans_position'])
-    for i in agents_index:
-        # self head position
-        observations[i][:2] = snakes_position[i][0][:]
-
-        # head surroundings
-        head_x = snakes_position[i][0][1]
-        head_y = snakes_position[i][0][0]
-        head_surrounding = get_surrounding_3(state, width, height, head_x, head_y)
-        observations[i][2:14] = head_surrounding[:]
-        # observations[i][14:16] = [head_x, head_y]
-        observations[i][14:16] = [snakes_position[i][1][1],  snakes_position[i][1][0]]
-        observations[i][16:18] = [snakes_position[i][-1][1],  snakes_position[i][-1][0]]
-
-        head_x_U = snakes_position[i ^ 1][0][1]
-        head_y_U = snakes_position[i ^ 1][0][0]
-        head_surrounding = get_surrounding_3(state, width, height, head_x_U, head_y_U)
-        observations[i][18:30] = head_surrounding[:]
-        # observations[i][32:34] = [head_x_U, head_y_U]
-        observations[i][30:32] = [snakes_position[i^1][1][1],  snakes_position[i^1][1][0]]
-        observations[i][32:34] = [snakes_position[i^1][-1][1],  snakes_position[i^1][-1][0]]
-        # other snake positions
-        snake_heads = [snake[0] for snake in snakes_position]
-        snake_heads = np.array(snake_heads[1:])
-        snake_heads -= snakes_position[i][0]
-        observations[i][34:36] = snake_heads.flatten()[:]
-        observations[i][36:38] = [len(snake) for snake in snakes_position]
-
-        observations[i][38] = step
-        # beans positions
-        beans = beans_position.flatten()
-        beans_len = len(beans)
-        observations[i][39 : 39 + beans_len] = beans[:]
-        if (beans_len < 10) : observations[i][39 + beans_len:] = 0
-        for j, (beans_y, beans_x) in enumerate(beans_position):
-            dis_my = min(abs(head_y - beans_y), abs(head_y + beans_y + 2 - height)) + min(abs(head_x - beans_x), abs(head_x + beans_x + 2 - width))
-            dis_U = min(abs(head_y_U - beans_y), abs(head_y_U + beans_y + 2 - height)) + min(abs(head_x_U - beans_x), abs(head_x_U + beans_x + 2 - width))
-            observations[i][49 + 2 * j - 2] = dis_my
-            observations[i][49 + 2 * j - 1] = dis_U
-        if (beans_len < 10) : observations[i][49 + beans_len:] = 0
-        observations[i][59:62] = get_min_bean(head_x, head_y, beans_position, width, height, snakes_position, state)
-        observations[i][62:65] = get_min_bean(head_x_U, head_y_U, beans_position, width, height, snakes_position, state)
-    return observations
+from agent.dqn.observation import controlled_observations
+from agent.dqn.numpy_critic import load_weights
 
 
 class Critic(nn.Module):
@@ -187,16 +40,45 @@ class DQN(object):
         self.critic_eval = Critic(self.state_dim, self.action_dim, self.hidden_size)
         self.critic_target = Critic(self.state_dim, self.action_dim, self.hidden_size)
 
+        # float32 input buffer shared with a tensor, filled in place on every move and
+        # grown when a batch does not fit
+        self.obs_buffer = np.zeros((1, self.state_dim), dtype=np.float32)
+        self.obs_tensor = torch.from_numpy(self.obs_buffer)
+
     def choose_action(self, observation):
-        observation = torch.tensor(observation, dtype=torch.float).view(1, -1)
-        action = torch.argmax(self.critic_eval(observation)).item()
-        return action
+        return self.choose_actions(observation)[0]
+
+    def choose_actions(self, observations):
+        # greedy actions of a batch of observations, one forward pass
+        observations = np.reshape(observations, (-1, self.state_dim))
+        n = len(observations)
+        if n > len(self.obs_buffer):
+            self.obs_buffer = np.zeros((n, self.state_dim), dtype=np.float32)
+            self.obs_tensor = torch.from_numpy(self.obs_buffer)
+        self.obs_buffer[:n] = observations
+        with torch.inference_mode():
+            actions = torch.argmax(self.critic_eval(self.obs_tensor[:n]), dim=1).tolist()
+        return actions
 
     def load(self, file):
         base_path = os.path.dirname(os.path.abspath(__file__))
         file = os.path.join(base_path, file)
-        self.critic_eval.load_state_dict(torch.load(file))
-        self.critic_target.load_state_dict(torch.load(file))
+        if file.endswith('.npz'):
+            # numpy export, float32 or int8
+            state_dict = {k: torch.from_numpy(v) for k, v in load_weights(file).items()}
+        else:
+            state_dict = torch.load(file)
+        self.critic_eval.load_state_dict(state_dict)
+        self.critic_target.load_state_dict(self.critic_eval.state_dict())
+
+    def export_numpy(self, file):
+        # float32 weights for agent.dqn.numpy_critic.NumpyCritic
+        np.savez(file, **{k: v.detach().cpu().numpy().astype(np.float32)
+                          for k, v in self.critic_eval.state_dict().items()})
+
+    def export_torchscript(self, file):
+        self.critic_eval.eval()
+        torch.jit.script(self.critic_eval).save(file)
     
     def store_transition(self, transition):
         if len(self.buffer) == self.buffer_size:
@@ -244,10 +126,9 @@ class DQN(object):
         torch.save(self.critic_eval.state_dict(), model_critic_path)
 
 
-def to_joint_action(actions, num_agent):
+def to_joint_action(actions):
     joint_action = []
-    for i in range(num_agent):
-        action = actions
+    for action in actions:
         one_hot_action = [0] * 4
         one_hot_action[action] = 1
         one_hot_action = [one_hot_action]
@@ -256,17 +137,29 @@ def to_joint_action(actions, num_agent):
 
 agent = DQN(65, 4, 1, 256)
 agent.load('critic_5000.pth')
+# the step feature of each seat, from 0 at that seat's first move of a game
+current_steps = {}
+
+def batch_controller(observation_lists, steps):
+    # the joint actions of several games (the observation list and step of each), for
+    # every controlled snake of every game from one forward pass
+    observations = [controlled_observations(observation_list, step)
+                    for observation_list, step in zip(observation_lists, steps)]
+    actions = agent.choose_actions(np.concatenate(observations))
+    joint_actions, start = [], 0
+    for observation_list in observation_lists:
+        joint_actions.append(to_joint_action(actions[start:start + len(observation_list)]))
+        start += len(observation_list)
+    return joint_actions
 
 def my_controller(observation_list, a, b):
-    obs_dim = 65
-    obs = observation_list[0]
-    board_width = obs['board_width']
-    board_height = obs['board_height']
-    ctrl_agent_index = [obs['controlled_snake_index'] for obs in observation_list]
-    state_map = obs['state_map']
-    info = {"beans_position": obs[1], "snakes_position": [obs[key] for key in obs.keys() & {2, 3}]}
-
-    observations = get_observations(state_map, info, ctrl_agent_index, obs_dim, board_height, board_width)
-    actions = agent.choose_action(observations)
-
-    return to_joint_action(actions, len(ctrl_agent_index))
\ No newline at end of file
+    seat = observation_list[0]['controlled_snake_index']
+    # no last directions on the first move of a game
+    if observation_list[0].get('last_direction') is None:
+        current_steps[seat] = 0
+    step = current_steps.get(seat, 0)
+    current_steps[seat] = step + 1
+    return batch_controller([observation_list], [step])[0]
+
+# the greedy action of the observation and step, so its moves can be memoized
+my_controller.deterministic = True
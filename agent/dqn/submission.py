@@ -0,0 +1,47 @@
+# -*- coding:utf-8  -*-
+# The DQN agent on the numpy export of critic_5000.pth, without torch.
+# The export is written with DQN.export_numpy (agent/dqn/rl_agent.py).
+import numpy as np
+
+from agent.dqn.numpy_critic import load_critic
+from agent.dqn.observation import controlled_observations
+
+critic = load_critic('critic_5000.npz')
+# the step feature of each seat, from 0 at that seat's first move of a game
+current_steps = {}
+
+
+def to_joint_action(actions):
+    joint_action = []
+    for action in actions:
+        one_hot_action = [0] * 4
+        one_hot_action[action] = 1
+        joint_action.append([one_hot_action])
+    return joint_action
+
+
+def batch_controller(observation_lists, steps):
+    # the joint actions of several games (the observation list and step of each), for
+    # every controlled snake of every game from one forward pass
+    observations = [controlled_observations(observation_list, step)
+                    for observation_list, step in zip(observation_lists, steps)]
+    actions = critic.choose_actions(np.concatenate(observations))
+    joint_actions, start = [], 0
+    for observation_list in observation_lists:
+        joint_actions.append(to_joint_action(actions[start:start + len(observation_list)]))
+        start += len(observation_list)
+    return joint_actions
+
+
+def my_controller(observation_list, action_space_list, is_act_continuous=False):
+    seat = observation_list[0]['controlled_snake_index']
+    # no last directions on the first move of a game
+    if observation_list[0].get('last_direction') is None:
+        current_steps[seat] = 0
+    step = current_steps.get(seat, 0)
+    current_steps[seat] = step + 1
+    return batch_controller([observation_list], [step])[0]
+
+
+# the greedy action of the observation and step, so its moves can be memoized
+my_controller.deterministic = True
@@ -2,7 +2,7 @@ import copy
 import math
 import numpy as np
 from numpy.lib import stride_tricks
-from torch._C import dtype
+from common.bitboard import get_torus, popcount, snake_reach
 
 def get_id(x, y, width):
     return x * width + y
@@ -129,8 +129,10 @@ def get_min_bean(x, y, beans_position, width, height, snakes, state):
         Ux = snakes[1][0][1]
         Uy = snakes[1][0][0]
         id = 0
-    mat = diji(state,y,x,width, height)
-    matU= diji(state,Uy, Ux, width,height)
+    # distances from both heads, one bitboard flood fill each
+    reach = snake_reach(state, snakes, width, height)
+    mat = reach[id][1]
+    matU = reach[id ^ 1][1]
     for i, (bean_y, bean_x) in enumerate(beans_position):
         distance_U = matU[bean_y][bean_x]
         if distance_U < min_distance_U:
@@ -177,34 +179,15 @@ def get_surrounding(state, width, height, x, y):
     return surrounding
 
 def keep_safe(X, Y, turn, state, width, height, snakes):
-    vis=np.zeros((height,width))
-    from queue import Queue
-    pq = Queue()
-    pq.put((X,Y))
-    dx = [-1,1,0,0]
-    dy = [0,0,-1,1]
+    # size of the area reachable from (X, Y); the tail of snakes[turn] is free when it
+    # belongs to snake 1 and (X, Y) is not a bean
+    torus = get_torus(width, height)
+    free = (state != 2) & (state != 3)
     mx = snakes[turn][-1][0]
     my = snakes[turn][-1][1]
-    cnt = 0
-    if (state[X][Y]==1): 
-        mx = -1
-        my = -1
-    while (not pq.empty()):
-        (x,y) =pq.get()
-        if (vis[x][y]==1): continue
-        vis[x][y] = 1
-        cnt += 1
-        for i in range(4):
-            x1=x+dx[i]
-            y1=y+dy[i]
-            x1 += height
-            x1 %= height
-            y1 += width
-            y1 %= width
-            
-            if (state[x1][y1]==2 or state[x1][y1]==3 and (x1 != mx or y1 != my)): continue
-            pq.put((x1,y1))
-    return cnt
+    tail = 0
+    if (state[X][Y] != 1 and state[mx][my] == 3): tail = torus.bit(mx, my)
+    return popcount(torus.region(torus.from_mask(free) | tail, torus.bit(X, Y)))
 def get_map(state, snakes, width, height, turn, dir):
     mp2=state.copy()
     x= snakes[turn][0][0]
@@ -225,36 +208,37 @@ def get_map(state, snakes, width, height, turn, dir):
         mp2[x][y]=turn + 2 
     return mp2
 
-def Cnt_d(state, beans, snakes, width, height, turn, dir):
-    mp=get_map(state,snakes,width,height,turn,dir)
-    xx = snakes[turn][0][0]
-    yy = snakes[turn][0][1]
+def free_neighbours(free, width, height):
+    # number of free neighbours of every cell on the torus, leading axes are batch axes
+    d = np.zeros(free.shape, dtype=int)
     dx = [-1,1,0,0]
     dy = [0,0,-1,1]
-    xx += dx[dir]
-    yy += dy[dir]
-    xx += height
-    yy += width
-    xx %= height
-    yy %= width
-    d=np.zeros((height,width))
-    for i in range(height):
-        for j in range(width):
-            for k in range(4):
-                x = i+ dx[k]
-                y = j+ dy[k]
-                x += height
-                y += width
-                x %= height
-                y %= height
-                if (mp[x][y]==0 or mp[x][y]==1 or (xx==x and yy==y)):
-                    d[i][j] += 1
-    cnt = 0 
-    for i in range(height):
-        for j in range(width):
-            if (d[i][j]<=1 and mp[i][j]<2):
-                cnt += 1
-    return cnt
+    for k in range(4):
+        d += np.roll(free, (-dx[k], -dy[k]), axis=(-2, -1))
+    return d
+
+def choke_map(maps, heads, width, height):
+    # maps: (..., height, width) boards after a move, heads: (..., 2) new head of each.
+    # Returns the free-neighbour count of every cell and the low-degree free cells.
+    free = (maps == 0) | (maps == 1)
+    head = np.zeros(maps.shape, dtype=bool)
+    lead = np.indices(maps.shape[:-2])
+    head[tuple(lead) + (heads[..., 0], heads[..., 1])] = True
+    d = free_neighbours(free | head, width, height)
+    return d, (d <= 1) & (maps < 2)
+
+def Cnt_d_all(state, beans, snakes, width, height, turn):
+    # Cnt_d of the four moves in one call
+    dx = [-1,1,0,0]
+    dy = [0,0,-1,1]
+    maps = np.stack([get_map(state, snakes, width, height, turn, dir) for dir in range(4)])
+    heads = np.array([[(snakes[turn][0][0] + dx[dir] + height) % height,
+                       (snakes[turn][0][1] + dy[dir] + width) % width] for dir in range(4)])
+    d, choke = choke_map(maps, heads, width, height)
+    return np.count_nonzero(choke, axis=(1, 2))
+
+def Cnt_d(state, beans, snakes, width, height, turn, dir):
+    return Cnt_d_all(state, beans, snakes, width, height, turn)[dir]
 
 def Check_Circle(snakes, id, width, height):
     x = snakes[id][0][0]
@@ -412,7 +396,23 @@ def Hit_the_wall (state, snakes, width, height, steps, turn):
             Q.put((get_map(mp,S,width,height,turn,i),get_snakes(mp,S,width,height,turn,i),thisdir, st+1))
     return -1
 
-def greedy_snake(state_map, beans, snakes, width, height, ctrl_agent_index, Current_Step):
+def probe_solved(beans, snakes, width, height, my_snake, step_cnt):
+    # the book or tablebase move, None when there is none or env/ is not on the path,
+    # as in a submission folder copied on its own
+    try:
+        from env.opening_book import probe_book
+        from env.tablebase import probe_observation
+    except ImportError:
+        return None
+    return probe_book(beans, snakes, width, height, my_snake, step_cnt) \
+        or probe_observation(beans, snakes, width, height, my_snake, step_cnt)
+
+def greedy_snake(state_map, beans, snakes, width, height, ctrl_agent_index, Current_Step, step_cnt=None):
+    # book openings and exact endgame moves, step_cnt is the env's (1 on the first move)
+    if (step_cnt is not None and len(ctrl_agent_index) == 1):
+        solved = probe_solved(beans, snakes, width, height, ctrl_agent_index[0], step_cnt)
+        if (solved is not None):
+            return [solved[1]]
     beans_position = copy.deepcopy(beans)
     actions = []
     for i in ctrl_agent_index:
@@ -459,6 +459,7 @@ def greedy_snake(state_map, beans, snakes, width, height, ctrl_agent_index, Curr
         Blok=np.zeros(4)
         D = np.zeros(4)
         T = np.zeros(4)
+        D_all = Cnt_d_all(state_map,beans,snakes,width,height,ctrl_agent_index[0])
         Tup = []
         for j in range(4):
             head_x_tmp = head_x + dx[j]
@@ -495,11 +496,15 @@ def greedy_snake(state_map, beans, snakes, width, height, ctrl_agent_index, Curr
                         Blok[j] -= 10
                         break
             if (head_surrounding[j]>1): D[j]=10000
-            else: D[j]= Cnt_d(state_map,beans,snakes,width,height,ctrl_agent_index[0],j)
+            else: D[j]= D_all[j]
             Tup.append((Blok[j],-dis[j],-D[j],j))
         actions.append(Tup.index(max(Tup))) 
     return actions
 
+# the same position and arguments give the same moves, so they can be memoized
+# (util/decision_cache.py)
+greedy_snake.deterministic = True
+
 def to_joint_action(actions, num_agent):
     joint_action = []
     for i in range(num_agent):
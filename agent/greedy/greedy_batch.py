@@ -0,0 +1,213 @@
+import numpy as np
+from agent.greedy.greedy_agent import greedy_snake, Check_Circle, choke_map
+
+# Batched version of greedy_snake: the distance fields (diji), the reachable
+# areas (keep_safe) and the dead-end counts (Cnt_d) of many boards are computed
+# at once with NumPy stencils on the torus.  Decisions are identical to
+# greedy_snake; the rare "chase the opponent's tail" branch is delegated to it.
+
+dx = [-1, 1, 0, 0]
+dy = [0, 0, -1, 1]
+
+
+def expand(mask):
+    return (mask | np.roll(mask, 1, axis=-2) | np.roll(mask, -1, axis=-2)
+            | np.roll(mask, 1, axis=-1) | np.roll(mask, -1, axis=-1))
+
+
+def distance_fields(walls, rows, cols):
+    # BFS distances from (rows[b], cols[b]) on every board, inf when unreachable.
+    # The source itself may be a wall, as in diji.
+    idx = np.arange(len(walls))
+    dist = np.full(walls.shape, np.inf)
+    dist[idx, rows, cols] = 0
+    reached = np.zeros(walls.shape, dtype=bool)
+    reached[idx, rows, cols] = True
+    free = ~walls
+    frontier = reached
+    step = 0
+    while True:
+        frontier = expand(frontier) & free & ~reached
+        if not frontier.any():
+            return dist
+        step += 1
+        reached |= frontier
+        dist[frontier] = step
+
+
+def region_sizes(free, rows, cols):
+    # Size of the region reachable from (rows[b], cols[b]), the seed counting as free.
+    idx = np.arange(len(free))
+    free = free.copy()
+    free[idx, rows, cols] = True
+    region = np.zeros(free.shape, dtype=bool)
+    region[idx, rows, cols] = True
+    cnt = 1
+    while True:
+        region = expand(region) & free
+        new_cnt = np.count_nonzero(region)
+        if new_cnt == cnt:
+            return region.sum(axis=(-2, -1))
+        cnt = new_cnt
+
+
+def next_maps(state, turns, head_rows, head_cols, tail_rows, tail_cols):
+    # get_map for all four moves of every board: shape (n, 4, height, width)
+    n, height, width = state.shape
+    idx = np.arange(n)[:, None]
+    maps = np.repeat(state[:, None], 4, axis=1)
+    eat = state[idx, head_rows, head_cols] == 1
+    on_tail = (head_rows == tail_rows[:, None]) & (head_cols == tail_cols[:, None])
+    move = ~eat & ~on_tail
+    b, j = np.nonzero(move)
+    maps[b, j, tail_rows[b], tail_cols[b]] = 0
+    b, j = np.nonzero(eat | move)
+    maps[b, j, head_rows[b, j], head_cols[b, j]] = turns[b] + 2
+    return maps
+
+
+def dead_ends(maps, head_rows, head_cols):
+    # Cnt_d for every map
+    height, width = maps.shape[-2:]
+    d, choke = choke_map(maps, np.stack([head_rows, head_cols], axis=-1), width, height)
+    return np.count_nonzero(choke, axis=(-2, -1))
+
+
+def bean_targets(dist_my, dist_U, beans, my_shorter):
+    # get_min_bean on padded bean arrays; beans holds -1 for missing beans
+    n, K = beans.shape[:2]
+    idx = np.arange(n)[:, None]
+    present = beans[..., 0] >= 0
+    rows = np.where(present, beans[..., 0], 0)
+    cols = np.where(present, beans[..., 1], 0)
+    d_my = np.where(present, dist_my[idx, rows, cols], np.inf)
+    d_U = np.where(present, dist_U[idx, rows, cols], np.inf)
+    index_U = np.argmin(d_U, axis=1) if K else np.zeros(n, dtype=int)
+    with np.errstate(invalid='ignore'):
+        distance = np.select(
+            [np.isinf(d_my), np.isinf(d_U), (d_U == 1) & (d_my == 1)],
+            [np.inf, d_my * 0.6, np.inf],
+            0.8 * d_my - 0.2 * d_U)
+    distance = np.where(my_shorter[:, None], d_my, distance)
+    distance = np.where((d_U < d_my) & (np.arange(K) == index_U[:, None]), d_my + 6, distance)
+    index = np.argmin(distance, axis=1) if K else np.zeros(n, dtype=int)
+    has_bean = present.any(axis=1)
+    bean_rows = np.where(has_bean, rows[np.arange(n), index] if K else 0, 0)
+    bean_cols = np.where(has_bean, cols[np.arange(n), index] if K else 0, 0)
+    return bean_rows, bean_cols
+
+
+def mix_distance(delta_len, my_len, d_bean, d_rear):
+    # f() of greedy_agent for every board and move
+    conds = [(delta_len <= 0) | (my_len <= 11), (delta_len == 1) | (my_len <= 12),
+             (delta_len == 2) | (my_len <= 13), (delta_len <= 4) | (my_len <= 15),
+             (delta_len <= 6) | (my_len <= 17), (delta_len <= 9) | (my_len <= 19)]
+    w_bean = np.select(conds, [1, 0.9, 0.7, 0.5, 0.3, 0.1], 0)[:, None]
+    w_rear = np.select(conds, [0, 0.1, 0.3, 0.5, 0.7, 0.9], 1)[:, None]
+    with np.errstate(invalid='ignore'):
+        mixed = d_bean * w_bean + d_rear * w_rear
+    return np.where(w_rear == 0, d_bean, np.where(w_bean == 0, d_rear, mixed))
+
+
+def greedy_snake_batch(state_maps, beans_list, snakes_list, width, height, ctrl_agent_index, Current_Step):
+    """
+    greedy_snake for many boards at once. ctrl_agent_index and Current_Step hold
+    one value per board (or a single value for all of them); returns one action per board.
+    """
+    n_board = len(snakes_list)
+    turns = np.broadcast_to(np.asarray(ctrl_agent_index, dtype=int).reshape(-1), (n_board,))
+    steps = np.broadcast_to(np.asarray(Current_Step, dtype=int).reshape(-1), (n_board,))
+    actions = np.zeros(n_board, dtype=int)
+
+    batch = []
+    for b in range(n_board):
+        snakes = snakes_list[b]
+        i = int(turns[b])
+        len_my = len(snakes[i])
+        len_U = len(snakes[i ^ 1])
+        (Flag, dirt) = Check_Circle(snakes, i, width, height)
+        if len_my > len_U + 2 and len_my > 13 and Flag:
+            actions[b] = dirt
+        elif len_my < len_U - 2 and (len_U >= 14 or len_U - len_my >= 5) and Check_Circle(snakes, i ^ 1, width, height)[0]:
+            actions[b] = greedy_snake(np.asarray(state_maps[b]), beans_list[b], snakes, width, height, [i], steps[b])[0]
+        else:
+            batch.append(b)
+    if not batch:
+        return actions
+
+    n = len(batch)
+    idx = np.arange(n)
+    state = np.stack([np.asarray(state_maps[b]) for b in batch])
+    turn = turns[batch]
+    step = steps[batch]
+    snakes = [snakes_list[b] for b in batch]
+    my = np.array([s[i][0] + s[i][-1] for s, i in zip(snakes, turn)])
+    U = np.array([s[i ^ 1][0] + s[i ^ 1][-1] for s, i in zip(snakes, turn)])
+    my_len = np.array([len(s[i]) for s, i in zip(snakes, turn)])
+    U_len = np.array([len(s[i ^ 1]) for s, i in zip(snakes, turn)])
+    K = max(len(beans_list[b]) for b in batch)
+    beans = np.full((n, K, 2), -1, dtype=int)
+    for k, b in enumerate(batch):
+        if len(beans_list[b]):
+            beans[k, :len(beans_list[b])] = np.asarray(beans_list[b], dtype=int)
+
+    head_rows = (my[:, 0, None] + np.array(dx) + height) % height
+    head_cols = (my[:, 1, None] + np.array(dy) + width) % width
+
+    # Get_NEW_MAP: my rear is free, the opponent's too unless a bean is next to its head
+    without_rear = state.copy()
+    without_rear[idx, my[:, 2], my[:, 3]] = 0
+    U_rows = (U[:, 0, None] + np.array(dx) + height) % height
+    U_cols = (U[:, 1, None] + np.array(dy) + width) % width
+    U_no_bean = ~(state[idx[:, None], U_rows, U_cols] == 1).any(axis=1)
+    without_rear[idx[U_no_bean], U[U_no_bean, 2], U[U_no_bean, 3]] = 0
+    blocked = without_rear[idx[:, None], head_rows, head_cols] > 1
+
+    # get_min_bean picks the other head by comparing against snake 0
+    first = np.array([s[0][0] for s in snakes])
+    is_first = (first[:, 0] == my[:, 0]) & (first[:, 1] == my[:, 1])
+    other = np.array([s[1][0] if f else s[0][0] for s, f in zip(snakes, is_first)])
+    len_first = np.array([len(s[0]) for s in snakes])
+    len_second = np.array([len(s[1]) for s in snakes])
+    my_shorter = np.where(is_first, len_first + 1 <= len_second, len_second + 1 <= len_first)
+
+    walls = (state == 2) | (state == 3)
+    fields = distance_fields(np.concatenate([walls, walls, walls]),
+                             np.concatenate([my[:, 0], other[:, 0], my[:, 2]]),
+                             np.concatenate([my[:, 1], other[:, 1], my[:, 3]]))
+    bean_rows, bean_cols = bean_targets(fields[:n], fields[n:2 * n], beans, my_shorter)
+    mat_rear = fields[2 * n:]
+    mat = distance_fields((without_rear == 2) | (without_rear == 3), bean_rows, bean_cols)
+
+    dis = mix_distance(my_len - U_len, my_len,
+                       mat[idx[:, None], head_rows, head_cols], mat_rear[idx[:, None], head_rows, head_cols])
+    dis[blocked] = 1000000
+
+    # keep_safe from my next head, and from the opponent's head once I have moved
+    free = np.repeat(without_rear[:, None] <= 1, 4, axis=1).reshape(4 * n, height, width)
+    Blok = region_sizes(free, head_rows.ravel(), head_cols.ravel()).reshape(n, 4).astype(float)
+    maps = next_maps(state, turn, head_rows, head_cols, my[:, 2], my[:, 3])
+    U_tail = np.zeros(state.shape, dtype=bool)
+    U_tail[idx, U[:, 2], U[:, 3]] = True
+    free = (maps <= 1) | ((maps == 3) & U_tail[:, None])
+    T = region_sizes(free.reshape(4 * n, height, width), np.repeat(U[:, 0], 4),
+                     np.repeat(U[:, 1], 4)).reshape(n, 4)
+
+    horizon = (50 - step)[:, None]
+    trapped = (Blok > T + 2) & (T <= np.minimum(5, horizon))
+    Blok_else = np.where(Blok <= np.minimum(4, horizon), (5 - Blok) * -10000, 55)
+    Blok_else[(head_rows == my[:, 2, None]) & (head_cols == my[:, 3, None])] = 55
+    Blok_else[(head_rows == U[:, 2, None]) & (head_cols == U[:, 3, None])] = 0
+    Blok = np.where(trapped, 66, Blok_else)
+    Blok[blocked] = -100000
+    near_U = np.zeros((n, 4), dtype=bool)
+    for k in range(4):
+        near_U |= (head_rows == U_rows[:, k, None]) & (head_cols == U_cols[:, k, None])
+    Blok[near_U & (my_len > U_len + 1)[:, None]] -= 10
+
+    D = dead_ends(maps, head_rows, head_cols).astype(float)
+    D[blocked] = 10000
+
+    order = np.lexsort((np.broadcast_to(np.arange(4), (n, 4)), -D, -dis, Blok), axis=-1)
+    actions[batch] = order[:, -1]
+    return actions
@@ -2,7 +2,6 @@ import copy
 import math
 import numpy as np
 from numpy.lib import stride_tricks
-from torch._C import dtype
 
 def get_id(x, y, width):
     return x * width + y
@@ -238,7 +237,7 @@ def Cnt_d(state, beans, snakes, width, height, turn, dir):
                 x += height
                 y += width
                 x %= height
-                y %= height
+                y %= width
                 if (mp[x][y]==0 or mp[x][y]==1):
                     d[i][j] += 1
     cnt = 0 
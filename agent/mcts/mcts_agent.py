@@ -0,0 +1,167 @@
+import math
+import random
+import time
+
+from env.bitboard_snakes import BitboardSnakes
+from env.opening_book import probe_book
+
+# Simultaneous-move Monte Carlo Tree Search with decoupled UCT: at every node each
+# snake keeps its own visit counts and values per action and picks its action with
+# UCB1, the child is the joint move.  Positions come from the bitboard engine, so
+# nodes are cheap and the tree is kept across moves whenever the observed position
+# is one of the root's children.  Eaten beans are not respawned inside the search.
+
+
+class Node(object):
+    __slots__ = ('state', 'actions', 'counts', 'values', 'children', 'visits')
+
+    def __init__(self, engine, state):
+        self.state = state
+        self.actions = [engine.legal_actions(state, i) or [state.directions[i]] for i in range(2)]
+        self.counts = [[0] * len(a) for a in self.actions]
+        self.values = [[0.0] * len(a) for a in self.actions]
+        self.children = {}
+        self.visits = 0
+
+
+class MCTS(object):
+    def __init__(self, width, height, max_step=50, time_budget=0.5, exploration=0.7,
+                 rollout_depth=12, greedy_rollout=0.8):
+        self.engine = BitboardSnakes(width, height, max_step)
+        self.time_budget = time_budget
+        self.exploration = exploration
+        self.rollout_depth = rollout_depth
+        self.greedy_rollout = greedy_rollout
+        size = width * height
+        self.torus_dist = [[min((a // width - b // width) % height, (b // width - a // width) % height)
+                            + min((a - b) % width, (b - a) % width) for b in range(size)] for a in range(size)]
+        self.root = None
+        self.iterations = 0
+
+    def reset(self):
+        self.root = None
+
+    def choose(self, beans, snakes, my_snake, step_cnt):
+        state = self.engine.from_observation(beans, snakes, step_cnt=step_cnt)
+        self.root = self.reuse(state)
+        deadline = time.time() + self.time_budget
+        self.iterations = 0
+        while time.time() < deadline:
+            for _ in range(16):
+                self.iterate(self.root)
+            self.iterations += 16
+        counts = self.root.counts[my_snake]
+        return self.root.actions[my_snake][counts.index(max(counts))]
+
+    def reuse(self, state):
+        # the root itself when nothing moved, else the child the observed move reached
+        if self.root is not None:
+            if self.root.state == state:
+                return self.root
+            for child in self.root.children.values():
+                if child.state == state:
+                    return child
+        return Node(self.engine, state)
+
+    def select(self, node, i):
+        counts = node.counts[i]
+        if 0 in counts:
+            return counts.index(0)
+        values = node.values[i]
+        log_n = math.log(node.visits)
+        best, best_k = -1.0, 0
+        for k in range(len(counts)):
+            ucb = values[k] / counts[k] + self.exploration * math.sqrt(log_n / counts[k])
+            if ucb > best:
+                best, best_k = ucb, k
+        return best_k
+
+    def iterate(self, root):
+        node = root
+        path = []
+        while True:
+            if self.engine.is_terminal(node.state):
+                value = self.evaluate(node.state, True)
+                break
+            k0 = self.select(node, 0)
+            k1 = self.select(node, 1)
+            path.append((node, k0, k1))
+            key = (k0, k1)
+            child = node.children.get(key)
+            if child is None:
+                next_state = self.engine.step(node.state, (node.actions[0][k0], node.actions[1][k1]))[0]
+                child = Node(self.engine, next_state)
+                node.children[key] = child
+                value = self.rollout(next_state)
+                break
+            node = child
+        for node, k0, k1 in path:
+            node.visits += 1
+            node.counts[0][k0] += 1
+            node.values[0][k0] += value
+            node.counts[1][k1] += 1
+            node.values[1][k1] += 1 - value
+
+    def rollout(self, state):
+        engine = self.engine
+        for _ in range(self.rollout_depth):
+            if engine.is_terminal(state):
+                return self.evaluate(state, True)
+            state = engine.step(state, (self.rollout_action(state, 0), self.rollout_action(state, 1)))[0]
+        return self.evaluate(state, engine.is_terminal(state))
+
+    def rollout_action(self, state, i):
+        # head for the nearest bean most of the time, otherwise a random safe move
+        actions = self.engine.legal_actions(state, i)
+        if not actions:
+            return state.directions[i]
+        if state.beans and random.random() < self.greedy_rollout:
+            neighbours = self.engine.neighbours[state.bodies[i][0]]
+            beans = [c for c in self.engine.torus.cells(state.beans)]
+            best, best_a = None, actions[0]
+            for a in actions:
+                dist = self.torus_dist[neighbours[a]]
+                d = min(dist[x * self.engine.width + y] for x, y in beans)
+                if best is None or d < best:
+                    best, best_a = d, a
+            return best_a
+        return random.choice(actions)
+
+    def evaluate(self, state, terminal):
+        # value for snake 0: win 1, draw 0.5, loss 0; open positions by length difference
+        diff = len(state.bodies[0]) - len(state.bodies[1])
+        if terminal:
+            return 1.0 if diff > 0 else (0.5 if diff == 0 else 0.0)
+        return 0.5 + 0.5 * math.tanh(0.5 * diff)
+
+
+# one tree per board and seat, so that in self-play each seat keeps its own tree
+searches = {}
+# the game step of each seat, counted from that seat's first move of a game
+current_steps = {}
+
+
+def mcts_snake(beans, snakes, width, height, my_snake, step_cnt, time_budget=0.5):
+    book = probe_book(beans, snakes, width, height, my_snake, step_cnt)
+    if book is not None:
+        return [book[1]]
+    if (width, height, my_snake) not in searches:
+        searches[(width, height, my_snake)] = MCTS(width, height, time_budget=time_budget)
+    search = searches[(width, height, my_snake)]
+    search.time_budget = time_budget
+    return [search.choose(beans, snakes, my_snake, step_cnt)]
+
+
+def my_controller(observation_list, action_space_list, is_act_continuous=False):
+    obs = observation_list[0]
+    seat = obs['controlled_snake_index']
+    # no last directions on the first move of a game
+    if obs.get('last_direction') is None:
+        current_steps[seat] = 0
+    current_steps[seat] = current_steps.get(seat, 0) + 1
+    snakes = [obs[2], obs[3]]
+    actions = mcts_snake(obs[1], snakes, obs['board_width'], obs['board_height'],
+                         seat, current_steps[seat])
+    each = [0] * 4
+    each[actions[0]] = 1
+    return [[each]]
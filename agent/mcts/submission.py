@@ -0,0 +1 @@
+from agent.mcts.mcts_agent import my_controller
@@ -5,6 +5,10 @@ from numpy.core.fromnumeric import shape
 from numpy.core.numeric import zeros_like
 import math
 import numpy as np
+import copy
+import time
+import atexit
+import multiprocessing
 
 def diji(state, X, Y, width, height):
     mp=np.zeros((height,width))
@@ -224,7 +228,12 @@ def it_dfs(d,turn,state,bean, snakes, width, height):
             if (turn==0):
                 return 0.7*ls[0]+0.2*ls[1]+0.1*ls[2]
             else: return 0.1*ls[0]+0.2*ls[1]+0.7*ls[2]
-def it_dfs_min_max(d,turn,state,bean, snakes, width, height,MinMax):
+class SearchTimeout(Exception):
+    pass
+
+def it_dfs_min_max(d,turn,state,bean, snakes, width, height,MinMax,deadline=None):
+    # deadline: absolute time after which the search gives up with SearchTimeout
+    if (deadline is not None and time.time()>deadline): raise SearchTimeout()
     if (d[turn]==0 or shape(bean)[0]<=3): return F_calc_greedy_hacker(state, bean, snakes, width, height)
     d[turn] -= 1
     cnt = 0
@@ -235,7 +244,7 @@ def it_dfs_min_max(d,turn,state,bean, snakes, width, height,MinMax):
     for i in range(4):
         if (Check_available(state, bean, snakes, width, height,turn,i)):
             cnt += 1
-            tmp= it_dfs_min_max(d,turn^1,get_map(state,bean,snakes,width,height,turn,i),get_beans(state,bean,snakes,width,height,turn,i),get_snakes(state,bean,snakes,width,height,turn,i),width,height,This_MIN_MAX)
+            tmp= it_dfs_min_max(d,turn^1,get_map(state,bean,snakes,width,height,turn,i),get_beans(state,bean,snakes,width,height,turn,i),get_snakes(state,bean,snakes,width,height,turn,i),width,height,This_MIN_MAX,deadline)
             if (turn==0):
                 if (tmp>This_MIN_MAX): This_MIN_MAX=tmp
                 # if (This_MIN_MAX>=MinMax): return This_MIN_MAX
@@ -279,7 +288,25 @@ def get_map(state, beans, snakes, width, height, turn, dir):
         mp2[x][y]=turn + 2 
     return mp2
 
-def search_snake(state,beans,snakes,width,height,my_snake):
+def probe_solved(beans, snakes, width, height, my_snake, step_cnt):
+    # the book or tablebase move, None when there is none or env/ is not on the path,
+    # as in a submission folder copied on its own
+    try:
+        from env.opening_book import probe_book
+        from env.tablebase import probe_observation
+    except ImportError:
+        return None
+    return probe_book(beans, snakes, width, height, my_snake, step_cnt) \
+        or probe_observation(beans, snakes, width, height, my_snake, step_cnt)
+
+def search_snake(state,beans,snakes,width,height,my_snake,workers=0,time_budget=0.8,step_cnt=None):
+    # book openings and exact endgame moves, step_cnt is the env's (1 on the first move)
+    if (step_cnt is not None):
+        solved = probe_solved(beans, snakes, width, height, my_snake, step_cnt)
+        if (solved is not None):
+            return [solved[1]]
+    if (workers>0):
+        return search_snake_parallel(state,beans,snakes,width,height,my_snake,workers,time_budget)
     if (my_snake==0):
         ans=-111111
         dir=0
@@ -303,6 +330,84 @@ def search_snake(state,beans,snakes,width,height,my_snake):
                     dir=i
         return [dir]
 
+# deterministic without workers; the root-parallel search stops at a deadline, so its
+# moves depend on timing and are not memoized (util/decision_cache.py)
+search_snake.deterministic = lambda arguments: not arguments['workers']
+
+# Root-parallel search: the root moves are searched by a pool of worker processes that
+# lives for the whole game. Every worker deepens its move until the deadline, which
+# the recursion checks at every node, and reports the static value of the move
+# followed by the value of each completed depth; the moves are compared at the
+# deepest depth all of them reached. A worker that does not answer in time gets the
+# static value of its move and the pool is recreated, so that its job cannot hold a
+# worker into the next move.
+search_pool = None
+search_pool_size = 0
+
+def get_search_pool(workers):
+    global search_pool, search_pool_size
+    if (search_pool is None or search_pool_size != workers):
+        close_search_pool()
+        search_pool = multiprocessing.Pool(workers)
+        search_pool_size = workers
+    return search_pool
+
+def close_search_pool():
+    global search_pool, search_pool_size
+    if (search_pool is not None):
+        search_pool.terminate()
+        search_pool = None
+        search_pool_size = 0
+
+atexit.register(close_search_pool)
+
+def static_root_value(state,beans,snakes,width,height,my_snake,dir):
+    mp_new=get_map(state,beans,snakes,width,height,my_snake,dir)
+    beans_new=get_beans(state,beans,snakes,width,height,my_snake,dir)
+    snakes_new=get_snakes(state,beans,copy.deepcopy(snakes),width,height,my_snake,dir)
+    return F_calc_greedy_hacker(mp_new,beans_new,snakes_new,width,height)
+
+def search_root_move(state,beans,snakes,width,height,my_snake,dir,deadline,max_extra=20):
+    mp_new=get_map(state,beans,snakes,width,height,my_snake,dir)
+    beans_new=get_beans(state,beans,snakes,width,height,my_snake,dir)
+    snakes_new=get_snakes(state,beans,copy.deepcopy(snakes),width,height,my_snake,dir)
+    values=[F_calc_greedy_hacker(mp_new,beans_new,copy.deepcopy(snakes_new),width,height)]
+    extra=0
+    while True:
+        start=time.time()
+        try:
+            if (my_snake==0): tmp = it_dfs_min_max([3+extra,4+extra],my_snake^1,mp_new,beans_new,copy.deepcopy(snakes_new),width,height,-100000,deadline)
+            else: tmp = it_dfs_min_max([4+extra,3+extra],my_snake^1,mp_new,beans_new,copy.deepcopy(snakes_new),width,height,100000,deadline)
+        except SearchTimeout:
+            return values
+        values.append(tmp)
+        cost=time.time()-start
+        # the next depth costs at least as much as this one
+        if (extra>=max_extra or time.time()+2*cost>deadline): return values
+        extra+=1
+
+def search_snake_parallel(state,beans,snakes,width,height,my_snake,workers=4,time_budget=0.8):
+    deadline=time.time()+time_budget
+    moves=[i for i in range(4) if Check_available(state,beans,snakes,width,height,my_snake,i)]
+    if (len(moves)==0): return [0]
+    pool=get_search_pool(workers)
+    jobs=[(i,pool.apply_async(search_root_move,(state,beans,snakes,width,height,my_snake,i,deadline))) for i in moves]
+    results={}
+    late=[]
+    for i,job in jobs:
+        try:
+            results[i]=job.get(timeout=max(deadline-time.time(),0)+0.05)
+        except multiprocessing.TimeoutError:
+            late.append(i)
+    if (late):
+        close_search_pool()
+        for i in late:
+            results[i]=[static_root_value(state,beans,snakes,width,height,my_snake,i)]
+    depth=min(len(values) for values in results.values())-1
+    if (my_snake==0): dir=max(results,key=lambda i: results[i][depth])
+    else: dir=min(results,key=lambda i: results[i][depth])
+    return [dir]
+
 def get_my_action2(state, beans ,snakes, width, height, my_snake):
     dx = [-1,1,0,0]
     dy = [0,0,-1,1]
@@ -329,11 +434,17 @@ def get_my_action2(state, beans ,snakes, width, height, my_snake):
                     dir=i
         return [dir]
 
+# the game step of each seat, counted from that seat's first move of a game
+current_steps = {}
 def my_controller(observation_list, action_space_list, is_act_continuous=False):
     joint_action = []
     width = observation_list[0]['board_width']
     height = observation_list[0]['board_height']
     mysnake = observation_list[0]['controlled_snake_index']
+    # no last directions on the first move of a game
+    if observation_list[0].get('last_direction') is None:
+        current_steps[mysnake] = 0
+    current_steps[mysnake] = current_steps.get(mysnake, 0) + 1
     state = np.zeros((height, width))
     beans = observation_list[0][1]
     snakes = []
@@ -345,7 +456,7 @@ def my_controller(observation_list, action_space_list, is_act_continuous=False):
         state[i[0], i[1]] = 2
     for i in snakes[1]:
         state[i[0], i[1]] = 3
-    actions = search_snake(state, beans, snakes, width, height, mysnake)
+    actions = search_snake(state, beans, snakes, width, height, mysnake, step_cnt=current_steps[mysnake])
     player = []
     each = [0] * 4
     each[actions[0]] = 1
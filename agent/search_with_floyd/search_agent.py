@@ -1,13 +1,10 @@
 from random import random
-from agent.dqn.rl_agent import get_observations
 import copy
 
-from numpy.core.fromnumeric import shape
-from numpy.core.numeric import zeros_like
+from numpy import shape
 from env.snakes import Snake
 import math
 import numpy as np
-import pandas as pd
 
 def get_id(y, x, width):
     return (y-1)*width+x
@@ -0,0 +1,110 @@
+import math
+from functools import lru_cache
+
+import numpy as np
+
+# Boards are Python ints with bit x * width + y set for cell (x, y).  Python ints
+# have arbitrary precision: an 8x6 board fits in one 64-bit word, a 20x10 board in
+# a few, and flood fills on the torus become shift-and-mask operations.
+# Directions follow the agents: 0 up (x-1), 1 down (x+1), 2 left (y-1), 3 right (y+1).
+
+
+class Torus(object):
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.n_bytes = (self.size + 7) // 8
+        self.full = (1 << self.size) - 1
+        self.first_col = sum(1 << (x * width) for x in range(height))
+        self.last_col = self.first_col << (width - 1)
+        self.row_shift = self.size - width
+
+    def bit(self, x, y):
+        return 1 << (x * self.width + y)
+
+    def shift(self, board, dir):
+        # move every cell one step towards dir
+        if dir == 0:
+            return (board >> self.width) | ((board << self.row_shift) & self.full)
+        if dir == 1:
+            return ((board << self.width) & self.full) | (board >> self.row_shift)
+        if dir == 2:
+            return ((board & ~self.first_col) >> 1) | ((board & self.first_col) << (self.width - 1))
+        return ((board & ~self.last_col) << 1) | ((board & self.last_col) >> (self.width - 1))
+
+    def expand(self, board):
+        # the board plus its four-neighbourhood
+        return board | self.shift(board, 0) | self.shift(board, 1) | self.shift(board, 2) | self.shift(board, 3)
+
+    def from_mask(self, mask):
+        packed = np.packbits(np.asarray(mask, dtype=bool).ravel(), bitorder='little')
+        return int.from_bytes(packed.tobytes(), 'little')
+
+    def to_mask(self, board):
+        raw = np.frombuffer(board.to_bytes(self.n_bytes, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder='little')[:self.size].reshape(self.height, self.width).astype(bool)
+
+    def cells(self, board):
+        # (x, y) of every set cell
+        while board:
+            low = board & -board
+            i = low.bit_length() - 1
+            yield divmod(i, self.width)
+            board ^= low
+
+    def region(self, free, seed):
+        # cells reachable from seed through free cells; the seed always counts
+        free |= seed
+        region = seed
+        while True:
+            grown = self.expand(region) & free
+            if grown == region:
+                return region
+            region = grown
+
+    def layers(self, free, seed):
+        # BFS frontiers from seed: layers[d] holds the cells first reached after d steps
+        reached = seed
+        frontier = seed
+        layers = [seed]
+        while True:
+            frontier = self.expand(frontier) & free & ~reached
+            if not frontier:
+                return layers
+            reached |= frontier
+            layers.append(frontier)
+
+    def distances(self, free, seed):
+        # first-reach distance of every cell as a (height, width) array, inf when unreachable
+        return self.layer_distances(self.layers(free, seed))
+
+    def layer_distances(self, layers):
+        dist = np.full((self.height, self.width), math.inf)
+        for d, layer in enumerate(layers):
+            for x, y in self.cells(layer):
+                dist[x, y] = d
+        return dist
+
+
+def popcount(board):
+    return bin(board).count('1')
+
+
+@lru_cache(maxsize=None)
+def get_torus(width, height):
+    return Torus(width, height)
+
+
+def snake_reach(state, snakes, width, height):
+    """
+    Flood fill from every snake head over the cells not occupied by a snake.
+    Returns one (region size, first-reach distances) pair per snake.
+    """
+    torus = get_torus(width, height)
+    free = torus.from_mask(np.asarray(state) < 2)
+    reach = []
+    for snake in snakes:
+        layers = torus.layers(free, torus.bit(snake[0][0], snake[0][1]))
+        reach.append((sum(popcount(layer) for layer in layers), torus.layer_distances(layers)))
+    return reach
@@ -0,0 +1,183 @@
+# -*- coding:utf-8  -*-
+from collections import namedtuple
+import numpy as np
+from common.bitboard import get_torus, popcount
+
+# Compact snakes state for search agents.  Cells are numbered x * width + y, every
+# snake is a tuple of cells from head to tail plus a bitmask, and the beans are one
+# bitmask, so a state is an immutable, hashable tuple that is free to copy.
+# Actions are the env's indices 0-3 (up, down, left, right).
+
+BitboardState = namedtuple('BitboardState', ['bodies', 'masks', 'beans', 'directions', 'step_cnt', 'terminated'])
+
+dx = [-1, 1, 0, 0]
+dy = [0, 0, -1, 1]
+# clear_or_regenerate explores right, down, up, left
+regen_dx = [0, 1, -1, 0]
+regen_dy = [1, 0, 0, -1]
+
+
+class BitboardSnakes(object):
+    def __init__(self, width, height, max_step=50, init_len=3):
+        self.width = width
+        self.height = height
+        self.max_step = max_step
+        self.init_len = init_len
+        self.torus = get_torus(width, height)
+        self.size = width * height
+        self.neighbours = [tuple(((c // width + dx[k]) % height) * width + (c % width + dy[k]) % width
+                                 for k in range(4)) for c in range(self.size)]
+        self.regen_neighbours = [[((c // width + regen_dx[k]) % height) * width + (c % width + regen_dy[k]) % width
+                                  for k in range(4)] for c in range(self.size)]
+
+    def from_observation(self, beans, snakes, directions=None, step_cnt=1):
+        # beans and snakes as in the dict observation / info: [[x, y], ...]
+        bodies = tuple(tuple(self.cell(pos) for pos in snake) for snake in snakes)
+        if directions is None:
+            directions = tuple(self.neighbours[body[1]].index(body[0]) for body in bodies)
+        return BitboardState(bodies, tuple(self.mask(body) for body in bodies),
+                             self.mask(self.cell(pos) for pos in beans), tuple(directions), step_cnt, False)
+
+    def from_env(self, env):
+        directions = tuple(env.actions.index(snake.direction) for snake in env.players)
+        return self.from_observation(env.beans_position, [snake.segments for snake in env.players],
+                                     directions, env.step_cnt)
+
+    def cell(self, pos):
+        return int(pos[0]) * self.width + int(pos[1])
+
+    def mask(self, cells):
+        m = 0
+        for c in cells:
+            m |= 1 << c
+        return m
+
+    def snakes(self, state):
+        return [[list(divmod(c, self.width)) for c in body] for body in state.bodies]
+
+    def beans(self, state):
+        return [[x, y] for x, y in self.torus.cells(state.beans)]
+
+    def to_map(self, state):
+        # state map as built by the search agents: 0 empty, 1 bean, i + 2 snake i
+        mp = np.zeros(self.size)
+        mp[[self.cell(pos) for pos in self.torus.cells(state.beans)]] = 1
+        for i, body in enumerate(state.bodies):
+            mp[list(body)] = i + 2
+        return mp.reshape(self.height, self.width)
+
+    def with_beans(self, state, beans):
+        # beans are respawned by the env's RNG, so they are fed back in from outside
+        return state._replace(beans=state.beans | self.mask(self.cell(pos) for pos in beans))
+
+    def occupied(self, state):
+        m = state.beans
+        for mask in state.masks:
+            m |= mask
+        return m
+
+    def legal_actions(self, state, i):
+        # moves onto an empty cell, a bean or the snake's own tail (Check_available)
+        body = state.bodies[i]
+        blocked = 0
+        for mask in state.masks:
+            blocked |= mask
+        blocked &= ~(1 << body[-1])
+        return [a for a, c in enumerate(self.neighbours[body[0]]) if not blocked >> c & 1]
+
+    def is_terminal(self, state):
+        return (state.terminated or state.step_cnt > self.max_step
+                or popcount(state.beans) + sum(len(body) for body in state.bodies) > self.size)
+
+    def step(self, state, actions):
+        """
+        Simultaneous move as in SnakeEatBeans.get_next_state, without respawning beans.
+        Returns (next state, rewards, hit list). A reverse action keeps the current
+        direction; the env picks a random one instead.
+        """
+        n = len(state.bodies)
+        bodies = list(state.bodies)
+        rest = list(state.masks)
+        directions = list(state.directions)
+        beans = state.beans
+        eat = [0] * n
+        for i in range(n):
+            a = actions[i]
+            if a ^ 1 == directions[i]:
+                a = directions[i]
+            directions[i] = a
+            body = bodies[i]
+            head = self.neighbours[body[0]][a]
+            if beans >> head & 1:
+                beans ^= 1 << head
+                eat[i] = 1
+                bodies[i] = (head,) + body
+            else:
+                rest[i] &= ~(1 << body[-1])
+                bodies[i] = (head,) + body[:-1]
+        masks = [rest[i] | (1 << bodies[i][0]) for i in range(n)]
+
+        # a snake dies when any other segment shares its head cell
+        hit = [0] * n
+        for i in range(n):
+            others = rest[i]
+            for k in range(n):
+                if k != i:
+                    others |= masks[k]
+            if others >> bodies[i][0] & 1:
+                hit[i] = 1
+
+        reward = list(eat)
+        terminated = state.terminated
+        for i in range(n):
+            if not hit[i]:
+                continue
+            reward[i] = self.init_len - len(bodies[i]) + eat[i]
+            occupied = beans
+            for k in range(n):
+                if k != i:
+                    occupied |= masks[k]
+            seg, direction = self.regenerate(occupied)
+            if seg is None:
+                bodies[i], masks[i] = (), 0
+                terminated = True
+            else:
+                bodies[i], masks[i] = seg, self.mask(seg)
+                if direction is not None:
+                    directions[i] = direction
+        next_state = BitboardState(tuple(bodies), tuple(masks), beans, tuple(directions),
+                                   state.step_cnt + 1, terminated)
+        return next_state, reward, hit
+
+    def regenerate(self, occupied):
+        # same deterministic placement as SnakeEatBeans.clear_or_regenerate
+        blocked = occupied
+        for start in range(self.size):
+            if blocked >> start & 1:
+                continue
+            q = [start]
+            seg = []
+            while q:
+                cur = q.pop(0)
+                if cur not in seg:
+                    seg.append(cur)
+                for c in self.regen_neighbours[cur]:
+                    if not blocked >> c & 1 and c not in q:
+                        blocked |= 1 << c
+                        q.append(c)
+                if len(seg) == self.init_len:
+                    return self.orient(seg)
+        return None, None
+
+    def orient(self, seg):
+        (x0, y0), (x1, y1), (x2, y2) = [divmod(c, self.width) for c in seg]
+        if (x0, y0) in ((x1, y2), (x2, y1)):
+            seg[0], seg[1] = seg[1], seg[0]
+            (x0, y0), (x1, y1) = (x1, y1), (x0, y0)
+        direction = None
+        if x0 == x1:
+            direction = 3 if y0 > y1 else 2
+        elif y0 == y1:
+            direction = 1 if x0 > x1 else 0
+        return tuple(seg), direction
+
@@ -3,23 +3,26 @@ from env.snakes import SnakeEatBeans
 # from env.snake_new import SnakeEatBeans
 import configparser
 import os
+from functools import lru_cache
 
 
-def make(env_type, conf=None):
+@lru_cache(maxsize=None)
+def load_config(path=os.path.join(os.path.dirname(__file__), 'config.ini')):
+    # config.ini is parsed once per process; every env gets its own copy of its section
     config = configparser.ConfigParser()
-    path = os.path.join(os.path.dirname(__file__), 'config.ini')
-    # print(path)
     config.read(path, encoding="utf-8")
-    env_list = config.sections()
-    conf_dic = {}
-    for env_name in env_list:
-        conf_dic[env_name] = config[env_name]
+    return {env_name: dict(config[env_name]) for env_name in config.sections()}
+
+
+def make(env_type, conf=None):
+    conf_dic = load_config()
+    env_list = list(conf_dic)
     if env_type not in env_list:
         raise Exception("可选环境列表：%s,传入环境为%s" % (str(env_list), env_type))
     if conf:
-        conf_dic[env_type] = conf
+        return SnakeEatBeans(conf)
 
-    env = SnakeEatBeans(conf_dic[env_type])
+    env = SnakeEatBeans(dict(conf_dic[env_type]))
     return env
 
 
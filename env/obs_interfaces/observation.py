@@ -1,7 +1,17 @@
 # -*- coding:utf-8  -*-
+import numpy as np
+
 obs_type = ["grid", "vector", "dict"]
 
 
+def readonly_state(current_state):
+    # the state as an array that agents can share without copying; writing to it
+    # raises, so an agent that needs to modify the map copies it first (np.array(state))
+    state = np.array(current_state)
+    state.flags.writeable = False
+    return state
+
+
 class GridObservation(object):
     def get_grid_observation(self, current_state, player_id, info_before):
         raise NotImplementedError
@@ -0,0 +1,146 @@
+# -*- coding:utf-8  -*-
+import argparse
+import multiprocessing
+import os
+import time
+
+from env.bitboard_snakes import BitboardSnakes
+from env.chooseenv import make
+from env.symmetry import bits, get_symmetry, hash_key
+from env.tablebase import Tablebase, build_table
+
+# Opening book for the 1v1 board.  The builder plays the first plies of games from
+# many seeds with a deep MCTS search for both seats, one process per game, and stores
+# the move of every position it searched; agents look the position up during the
+# first book_steps steps instead of searching.  The table is the tablebase's (a 64-bit
+# key, the searched win rate of the move in percent, the move), so a lookup is a hash
+# and a probe or two.
+#
+# Keys are canonical under the torus symmetries (env/symmetry.py) from the seat's
+# point of view: its snake first, its head moved to cell 0, the best of the four
+# reflections, and the move is stored in that frame.  Starting positions that are
+# translations or reflections of one already searched are skipped.  The seat is not
+# part of the key: the seats only differ in the order snakes regenerate after a
+# crash, which the opening does not see.
+#
+# Starting positions are random (two 3-cell snakes and 5 beans anywhere), so a book
+# built from seeds a..b covers games started from those seeds, e.g. an evaluation run
+# with the same --seed, and later plies only as long as both snakes follow its moves.
+#
+#   python -m env.opening_book --seed 0 --games 1000 --workers 4
+
+default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book_1v1.npy')
+
+
+def book_key(symmetry, state, seat):
+    # (key, transform to the canonical frame) of the position seen by seat
+    bodies = (state.bodies[seat], state.bodies[seat ^ 1])
+    directions = (state.directions[seat], state.directions[seat ^ 1])
+    data, transform = symmetry.canonical(bodies, bits(state.beans), directions)
+    return hash_key(bytes([state.step_cnt]) + data), transform
+
+
+def observed_state(engine, env):
+    # the position as agents rebuild it from their observation
+    return engine.from_observation(env.beans_position, [snake.segments for snake in env.players],
+                                   step_cnt=env.step_cnt)
+
+
+def search_line(job):
+    # the book entries of the first plies of the game of seed, searched for both seats
+    from agent.mcts.mcts_agent import MCTS
+    seed, plies, time_budget = job
+    env = make('snakes_1v1')
+    env.reset(seed=seed)
+    symmetry = get_symmetry(env.board_width, env.board_height)
+    searches = [MCTS(env.board_width, env.board_height, env.max_step, time_budget) for _ in range(2)]
+    entries = []
+    for ply in range(plies):
+        actions = []
+        for seat in range(2):
+            search = searches[seat]
+            state = observed_state(search.engine, env)
+            action = search.choose(env.beans_position, [snake.segments for snake in env.players], seat, env.step_cnt)
+            k = search.root.actions[seat].index(action)
+            value = search.root.values[seat][k] / max(search.root.counts[seat][k], 1)
+            key, transform = book_key(symmetry, state, seat)
+            entries.append((key, int(round(100 * value)), symmetry.transform_action(action, transform)))
+            actions.append(action)
+        _, _, done, _, _ = env.step(env.encode(actions))
+        if done:
+            break
+    return seed, entries
+
+
+def distinct_starts(seeds):
+    # the seeds whose starting positions are not symmetric to an earlier one's
+    env = make('snakes_1v1')
+    engine = BitboardSnakes(env.board_width, env.board_height, env.max_step)
+    symmetry = get_symmetry(env.board_width, env.board_height)
+    seen, result = set(), []
+    for seed in seeds:
+        env.reset(seed=seed)
+        key = book_key(symmetry, observed_state(engine, env), 0)[0]
+        if key not in seen:
+            seen.add(key)
+            result.append(seed)
+    return result
+
+
+def build_book(seeds, plies=8, time_budget=2.0, workers=1, path=None):
+    starts = distinct_starts(seeds)
+    jobs = [(seed, plies, time_budget) for seed in starts]
+    entries = {}
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        lines = pool.imap_unordered(search_line, jobs)
+    else:
+        pool, lines = None, map(search_line, jobs)
+    for seed, line in lines:
+        for key, value, action in line:
+            entries.setdefault(key, (value, action))
+    if pool is not None:
+        pool.close()
+        pool.join()
+    capacity = build_table(entries, path or default_path)
+    return len(starts), len(entries), capacity
+
+
+book = None
+engines = {}
+
+
+def probe_book(beans, snakes, width, height, seat, step_cnt, book_steps=8):
+    """
+    Agents' lookup, (win rate in percent, action) of the seat's book move during the
+    first book_steps steps of a 1v1 game, None when the position is not in the book.
+    """
+    global book
+    if len(snakes) != 2 or width * height > 256 or step_cnt > book_steps or not os.path.exists(default_path):
+        return None
+    if (width, height) not in engines:
+        engines[(width, height)] = BitboardSnakes(width, height)
+    engine, symmetry = engines[(width, height)], get_symmetry(width, height)
+    key, transform = book_key(symmetry, engine.from_observation(beans, snakes, step_cnt=step_cnt), seat)
+    if book is None:
+        book = Tablebase(default_path)
+    found = book.get(key)
+    if found is None:
+        return None
+    return found[0], symmetry.transform_action(found[1], transform)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", default=0, type=int, help="first seed of the games")
+    parser.add_argument("--games", default=1000, type=int)
+    parser.add_argument("--plies", default=8, type=int, help="moves of each game to search")
+    parser.add_argument("--time_budget", default=2.0, type=float, help="seconds of search per move")
+    parser.add_argument("--workers", default=multiprocessing.cpu_count(), type=int)
+    parser.add_argument("--out", default=default_path)
+    args = parser.parse_args()
+    start = time.time()
+    starts, n_entries, capacity = build_book(range(args.seed, args.seed + args.games), args.plies,
+                                             args.time_budget, args.workers, args.out)
+    print("%d games, %d distinct starts, %d positions, %d slots, %.1f KB, %.1fs" % (
+        args.games, starts, n_entries, capacity, os.path.getsize(args.out) / 2 ** 10, time.time() - start))
@@ -0,0 +1,245 @@
+# -*- coding:utf-8  -*-
+import itertools
+import json
+import struct
+
+import numpy as np
+
+from env.bitboard_snakes import BitboardSnakes, BitboardState
+from env.symmetry import get_symmetry
+
+# Compact binary game records.  A record holds the initial position and, per step,
+# the joint action packed two bits per snake plus the cells of the beans spawned in
+# that step; every other position is rebuilt by replaying the steps through the
+# bitboard engine.  Keyframes (full positions) can be stored every few steps so a
+# position in the middle of a long game is reached without replaying from the start.
+#
+# header:   magic, version, width, height, n_snakes, init_len, max_step, keyframe
+#           interval, seed (-1 when unknown), length-prefixed JSON metadata
+# frame:    step_cnt, directions, n_beans and bean cells in env order, every snake's
+#           length and cells from head to tail
+# step:     joint action bytes, spawn count (bit 7 set when a keyframe follows),
+#           spawned bean cells, optional length-prefixed keyframe
+#
+# Cells are x * width + y in one byte, or two on boards larger than 256 cells.
+
+MAGIC = b'SNKR'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBBHHqI')
+KEYFRAME = 0x80
+actions_name = ["up", "down", "left", "right"]
+
+
+def pack_actions(actions):
+    packed = bytearray((len(actions) + 3) // 4)
+    for i, a in enumerate(actions):
+        packed[i >> 2] |= a << (2 * (i & 3))
+    return bytes(packed)
+
+
+def unpack_actions(data, n):
+    return [(data[i >> 2] >> (2 * (i & 3))) & 3 for i in range(n)]
+
+
+class ReplayCodec(object):
+    def __init__(self, width, height, n_snakes):
+        self.width = width
+        self.height = height
+        self.n_snakes = n_snakes
+        self.cell_type = np.dtype('<u1') if width * height <= 256 else np.dtype('<u2')
+        self.action_bytes = (n_snakes + 3) // 4
+
+    def cells(self, cells):
+        return np.asarray(cells, dtype=self.cell_type).tobytes()
+
+    def encode_frame(self, state, beans):
+        cells = [len(beans)] + list(beans)
+        for body in state.bodies:
+            cells.append(len(body))
+            cells.extend(body)
+        return struct.pack('<H', state.step_cnt) + bytes(state.directions) + self.cells(cells)
+
+    def decode_frame(self, engine, data):
+        (step_cnt,) = struct.unpack_from('<H', data)
+        directions = tuple(data[2:2 + self.n_snakes])
+        cells = np.frombuffer(data, dtype=self.cell_type, offset=2 + self.n_snakes).tolist()
+        beans = cells[1:1 + cells[0]]
+        pos = 1 + cells[0]
+        bodies = []
+        for _ in range(self.n_snakes):
+            bodies.append(tuple(cells[pos + 1:pos + 1 + cells[pos]]))
+            pos += cells[pos] + 1
+        state = BitboardState(tuple(bodies), tuple(engine.mask(body) for body in bodies),
+                              engine.mask(beans), directions, step_cnt, False)
+        return state, beans
+
+
+class ReplayRecorder(object):
+    """
+    Records a SnakeEatBeans game as it is played: create it after env.reset() and call
+    record(env, joint_action, info_after) after every env.step(joint_action).
+    With out, every chunk is written to that binary stream as it is produced.
+    """
+
+    def __init__(self, env, meta=None, seed=None, keyframe_interval=0, out=None):
+        self.engine = BitboardSnakes(env.board_width, env.board_height, env.max_step, env.init_len)
+        self.codec = ReplayCodec(env.board_width, env.board_height, env.n_player)
+        self.keyframe_interval = keyframe_interval
+        self.state = self.engine.from_env(env)
+        self.beans = [self.engine.cell(pos) for pos in env.beans_position]
+        meta = json.dumps(meta or {}, ensure_ascii=False).encode('utf-8')
+        if seed is None:
+            seed = getattr(env, 'rng_seed', None)
+        self.out = out
+        self.chunks = []
+        self.write(HEADER.pack(MAGIC, VERSION, env.board_width, env.board_height, env.n_player,
+                               env.init_len, env.max_step, keyframe_interval,
+                               -1 if seed is None else seed, len(meta)) + meta)
+        self.add_frame(self.state, self.beans)
+        self.n_steps = 0
+
+    def write(self, chunk):
+        if self.out is None:
+            self.chunks.append(chunk)
+        else:
+            self.out.write(chunk)
+
+    def add_frame(self, state, beans):
+        frame = self.codec.encode_frame(state, beans)
+        self.write(struct.pack('<H', len(frame)) + frame)
+
+    def record(self, env, joint_action, info_after):
+        actions = [each[0].index(1) for each in joint_action]
+        target = self.engine.from_env(env)
+        env_beans = [self.engine.cell(pos) for pos in env.beans_position]
+        actions, n_left = self.match_step(actions, target, env_beans, info_after['hit'])
+        self.n_steps += 1
+        keyframe = n_left is None or (self.keyframe_interval and self.n_steps % self.keyframe_interval == 0)
+        spawned = [] if n_left is None else env_beans[n_left:]
+        self.write(pack_actions(actions) + bytes([len(spawned) | (KEYFRAME if keyframe else 0)])
+                   + self.codec.cells(spawned))
+        self.state = target
+        self.beans = env_beans
+        if keyframe:
+            self.add_frame(self.state, self.beans)
+
+    def match_step(self, actions, target, env_beans, env_hit):
+        # A reverse action makes the env pick a random direction.  Store the directions
+        # that reproduce the observed step, with the number of beans left uneaten (the env
+        # appends the spawned ones); None when no choice does and a keyframe is stored
+        choices = [[d, d ^ 2, d ^ 3] if a ^ 1 == d else [a] for a, d in zip(actions, self.state.directions)]
+        for joint in itertools.product(*choices):
+            state, _, hit = self.engine.step(self.state, joint)
+            left = [c for c in self.beans if state.beans >> c & 1]
+            if state.bodies == target.bodies and state.directions == target.directions \
+                    and hit == list(env_hit) and env_beans[:len(left)] == left:
+                return list(joint), len(left)
+        return [d for d in target.directions], None
+
+    def to_bytes(self):
+        return b''.join(self.chunks)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+
+class Replay(object):
+    def __init__(self, data):
+        magic, version, width, height, n_snakes, init_len, max_step, keyframe_interval, seed, meta_len = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise Exception("not a snakes replay (version %d)" % VERSION)
+        self.width, self.height, self.n_snakes = width, height, n_snakes
+        self.keyframe_interval = keyframe_interval
+        self.seed = None if seed < 0 else seed
+        pos = HEADER.size
+        self.meta = json.loads(data[pos:pos + meta_len].decode('utf-8'))
+        pos += meta_len
+        self.engine = BitboardSnakes(width, height, max_step, init_len)
+        self.codec = ReplayCodec(width, height, n_snakes)
+        frame, pos = self.read_frame(data, pos)
+        self.initial = frame
+        # per step: actions, spawned cells, keyframe after the step or None.
+        # A record cut short while streaming keeps its complete steps
+        self.steps = []
+        cell_size = self.codec.cell_type.itemsize
+        while pos + self.codec.action_bytes < len(data):
+            actions = unpack_actions(data[pos:pos + self.codec.action_bytes], n_snakes)
+            flags = data[pos + self.codec.action_bytes]
+            n_spawned = flags & ~KEYFRAME
+            end = pos + self.codec.action_bytes + 1 + n_spawned * cell_size
+            if end > len(data):
+                break
+            spawned = np.frombuffer(data[end - n_spawned * cell_size:end], dtype=self.codec.cell_type).tolist()
+            keyframe = None
+            if flags & KEYFRAME:
+                if end + 2 > len(data) or end + 2 + struct.unpack_from('<H', data, end)[0] > len(data):
+                    break
+                keyframe, end = self.read_frame(data, end)
+            pos = end
+            self.steps.append((actions, spawned, keyframe))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+
+    def read_frame(self, data, pos):
+        (n,) = struct.unpack_from('<H', data, pos)
+        return self.codec.decode_frame(self.engine, data[pos + 2:pos + 2 + n]), pos + 2 + n
+
+    def __len__(self):
+        return len(self.steps)
+
+    def advance(self, frame, t):
+        # the frame after step t (0-based) from the frame before it, with the step's rewards and hits
+        state, beans = frame
+        actions, spawned, keyframe = self.steps[t]
+        next_state, reward, hit = self.engine.step(state, actions)
+        if keyframe is not None:
+            return keyframe, reward, hit
+        beans = [c for c in beans if next_state.beans >> c & 1] + spawned
+        return (next_state._replace(beans=self.engine.mask(beans)), beans), reward, hit
+
+    def frame(self, t):
+        # (state, bean cells in env order) after t steps, from the nearest keyframe
+        start, frame = 0, self.initial
+        for k in range(t - 1, -1, -1):
+            if self.steps[k][2] is not None:
+                start, frame = k + 1, self.steps[k][2]
+                break
+        for k in range(start, t):
+            frame = self.advance(frame, k)[0]
+        return frame
+
+    def position_keys(self, seat=0):
+        # canonical keys (env/symmetry.py) of the initial position and the one after every
+        # step, with the directions an observation shows (a respawned snake's is random)
+        symmetry = get_symmetry(self.width, self.height)
+        frame = self.initial
+        keys = []
+        for t in range(len(self.steps) + 1):
+            if t:
+                frame = self.advance(frame, t - 1)[0]
+            state = frame[0]
+            observed = self.engine.from_observation(self.engine.beans(state), self.engine.snakes(state),
+                                                    step_cnt=state.step_cnt)
+            keys.append(symmetry.canonical_key(observed, seat)[0])
+        return keys
+
+    def positions(self, frame):
+        state, beans = frame
+        return {"snakes_position": self.engine.snakes(state),
+                "beans_position": [list(divmod(c, self.width)) for c in beans]}
+
+    def infos(self):
+        # the steps as run_log records them, without the timestamps
+        frame = self.initial
+        for t in range(len(self.steps)):
+            info_before = {"directions": [actions_name[d] for d in frame[0].directions]}
+            frame, reward, hit = self.advance(frame, t)
+            info_after = self.positions(frame)
+            info_after["hit"] = hit
+            info_after["score"] = [len(body) - self.engine.init_len for body in frame[0].bodies]
+            yield {"info_before": info_before, "reward": reward, "info_after": info_after}
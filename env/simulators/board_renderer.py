@@ -0,0 +1,119 @@
+# -*- coding:utf-8  -*-
+import numpy as np
+
+# Headless board rendering on numpy canvases.  Every cell value is pre-rendered once
+# into a tile and a frame only copies the tiles of the cells that changed since the
+# previous frame, instead of copying the board image and drawing every cell with PIL.
+# The frames are pixel for pixel those of GridGame._render_board.
+#
+# Two canvases are kept: rgb (height, width, 3) and index, the same picture as indices
+# into palette, which GIF frames use as they are.
+#
+# palette: background, grid line, cell outline, then the color of every cell value
+
+BACKGROUND = (250, 235, 215)
+GRID_LINE = (105, 105, 105)
+OUTLINE = (192, 192, 192)
+
+
+class BoardRenderer(object):
+    def __init__(self, width, height, colors, unit=40, fix=8):
+        if len(colors) + 3 > 256:
+            raise Exception("at most 253 cell colors can be rendered, got %d" % len(colors))
+        self.width = width
+        self.height = height
+        self.unit = unit
+        self.fix = fix
+        self.palette = np.array([BACKGROUND, GRID_LINE, OUTLINE] + [tuple(c) for c in colors], dtype=np.uint8)
+        self.tiles = {}
+        self.index = np.tile(self.tile(0)[0], (height, width))
+        self.rgb = self.palette[self.index]
+        self.shown = np.zeros((height, width), dtype=np.int64)
+
+    def tile(self, value):
+        # (index tile, rgb tile) of one cell; 0 is an empty cell
+        if value not in self.tiles:
+            unit, margin = self.unit, self.unit // self.fix
+            tile = np.zeros((unit, unit), dtype=np.uint8)
+            tile[0, :] = 1
+            tile[:, 0] = 1
+            if value:
+                lo, hi = margin, unit - margin
+                tile[lo:hi + 1, lo:hi + 1] = 2
+                tile[lo + 1:hi, lo + 1:hi] = value + 3
+            self.tiles[value] = (tile, self.palette[tile])
+        return self.tiles[value]
+
+    def update(self, grid_map):
+        # draw the cells that differ from the shown frame, returns how many did
+        grid = np.asarray(grid_map, dtype=np.int64)
+        changed = np.argwhere(grid != self.shown)
+        unit = self.unit
+        for x, y in changed:
+            index, rgb = self.tile(int(grid[x, y]))
+            self.index[x * unit:(x + 1) * unit, y * unit:(y + 1) * unit] = index
+            self.rgb[x * unit:(x + 1) * unit, y * unit:(y + 1) * unit] = rgb
+        self.shown = grid
+        return len(changed)
+
+    def render(self, grid_map):
+        self.update(grid_map)
+        return self.rgb.copy()
+
+
+class EpisodeWriter(object):
+    """
+    Writes an episode as a GIF or an MP4 (needs imageio with ffmpeg), by the suffix of
+    path. add(grid_map) renders the next frame; GIF frames are kept as palette indices,
+    one byte a pixel, until close(), MP4 frames are encoded as they come.
+    """
+
+    def __init__(self, path, renderer, fps=5):
+        self.path = path
+        self.renderer = renderer
+        self.fps = fps
+        self.frames = []
+        self.video = None
+        if path.endswith('.mp4'):
+            try:
+                import imageio
+            except ImportError:
+                raise Exception("writing MP4 needs the imageio and imageio-ffmpeg packages")
+            self.video = imageio.get_writer(path, fps=fps)
+        elif not path.endswith('.gif'):
+            raise Exception("episodes are written as .gif or .mp4, got %s" % path)
+
+    def add(self, grid_map):
+        self.renderer.update(grid_map)
+        if self.video is not None:
+            self.video.append_data(self.renderer.rgb)
+        else:
+            self.frames.append(self.renderer.index.copy())
+
+    def close(self):
+        if self.video is not None:
+            self.video.close()
+            self.video = None
+        elif self.frames:
+            from PIL import Image
+            palette = self.renderer.palette.flatten().tolist()
+            images = []
+            for frame in self.frames:
+                # putpalette turns the L image into a P image
+                im = Image.fromarray(frame)
+                im.putpalette(palette)
+                images.append(im)
+            images[0].save(self.path, save_all=True, append_images=images[1:], duration=1000 // self.fps, loop=0)
+            self.frames = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def write_episode(path, renderer, grid_maps, fps=5):
+    with EpisodeWriter(path, renderer, fps) as writer:
+        for grid_map in grid_maps:
+            writer.add(grid_map)
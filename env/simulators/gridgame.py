@@ -1,7 +1,7 @@
-from PIL import Image, ImageDraw
 from itertools import count
 import numpy as np
 from env.simulators.game import Game
+from env.simulators.board_renderer import BoardRenderer, write_episode
 
 UNIT = 40
 FIX = 8
@@ -16,8 +16,8 @@ class GridGame(Game):
         self.board_width = int(conf['board_width'])
         self.board_height = int(conf['board_height'])
         self.agent_nums = [int(i) for i in str(conf['agent_nums']).split(',')]
-        self.cell_range = conf['cell_range'] if isinstance(eval(str(conf['cell_range'])), tuple) else (
-        int(conf['cell_range']),)
+        cell_range = eval(str(conf['cell_range']))
+        self.cell_range = conf['cell_range'] if isinstance(cell_range, tuple) else (int(cell_range),)
         self.cell_dim = len(self.cell_range)
         self.cell_size = np.prod(self.cell_range)
 
@@ -48,16 +48,39 @@ class GridGame(Game):
         self.n_return = [0] * self.n_player
         self.won = ''
 
-        # render 相关
+        # render 相关, the board image, the renderer and the colors are built on first use.
+        # game_tape keeps the grid map of every rendered frame, see save_tape
         self.grid_unit = unit_size
-        self.grid = GridGame.init_board(self.board_width, self.board_height, unit_size)
+        self._grid = None
+        self._renderer = None
         self.grid_unit_fix = fix
         self.game_tape = []
-        self.colors = colors + generate_color(
-            self.cell_size - len(colors) + 1) if not colors is None else generate_color(
-            self.cell_size)
+        self._base_colors = colors
+        self._colors = None
         self.init_info = None
 
+    @property
+    def grid(self):
+        if self._grid is None:
+            self._grid = GridGame.init_board(self.board_width, self.board_height, self.grid_unit)
+        return self._grid
+
+    @property
+    def renderer(self):
+        if self._renderer is None:
+            self._renderer = BoardRenderer(self.board_width, self.board_height, self.colors, self.grid_unit,
+                                           self.grid_unit_fix)
+        return self._renderer
+
+    @property
+    def colors(self):
+        if self._colors is None:
+            colors = self._base_colors
+            self._colors = colors + generate_color(
+                self.cell_size - len(colors) + 1) if not colors is None else generate_color(
+                self.cell_size)
+        return self._colors
+
     def get_grid_obs_config(self, player_id):
         return self.ob_board_width[player_id], self.ob_board_height[player_id], self.ob_cell_range[player_id]
 
@@ -160,14 +183,18 @@ class GridGame(Game):
             print(chr(i + 65), self.current_state[i])
 
     def render_board(self):
-        im_data = np.array(
-            GridGame._render_board(self.get_render_data(self.current_state), self.grid, self.colors, self.grid_unit,
-                                   self.grid_unit_fix))
-        self.game_tape.append(im_data)
-        return im_data
+        grid_map = np.array(self.get_render_data(self.current_state), dtype=np.uint8)
+        self.game_tape.append(grid_map)
+        return self.renderer.render(grid_map)
+
+    def save_tape(self, path, fps=5):
+        # the rendered frames as a .gif or .mp4
+        write_episode(path, BoardRenderer(self.board_width, self.board_height, self.colors, self.grid_unit,
+                                          self.grid_unit_fix), self.game_tape, fps)
 
     @staticmethod
     def init_board(width, height, grid_unit, color=(250, 235, 215)):
+        from PIL import Image, ImageDraw
         im = Image.new(mode="RGB", size=(width * grid_unit, height * grid_unit), color=color)
         draw = ImageDraw.Draw(im)
         for x in range(0, width):
@@ -182,6 +209,7 @@ class GridGame(Game):
             完成基本渲染棋盘操作
             设置extra_info参数仅为了保持子类方法签名的一致
         """
+        from PIL import ImageDraw
         im = board.copy()
         draw = ImageDraw.Draw(im)
         for x, row in zip(count(0), state):
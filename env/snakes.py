@@ -1,5 +1,4 @@
 from env.simulators.gridgame import GridGame
-import random
 from env.obs_interfaces.observation import *
 from util.discrete import Discrete
 import itertools
@@ -22,6 +21,11 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
         self.players = []
         self.cur_bean_num = 0
         self.beans_position = []
+        self.state_view = None
+        # every random draw of the game comes from this generator, see reset(seed=...).
+        # Unseeded, it is seeded from the global NumPy RNG, so np.random.seed still fixes the games
+        self.rng_seed = None
+        self.np_random = np.random.default_rng(np.random.randint(2 ** 31))
         # 1<= init_len <= 3
         self.init_len = 3
         self.current_state = self.init_state()
@@ -56,11 +60,43 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
 
         return key_info
 
+    def get_state_view(self, current_state):
+        # one read-only array per state, shared by every player and policy
+        if self.state_view is None or self.state_view[0] is not current_state:
+            self.state_view = (current_state, readonly_state(current_state))
+        return self.state_view[1]
+
+    def get_dict_many_view(self, current_state, player_id_list, info_before=''):
+        """
+        get_dict_many_observation for handing to agents without a deepcopy: the state
+        map is the shared read-only view and positions are fresh lists, shared between
+        the observations of one call as they were after a deepcopy of the list.
+        """
+        state = self.get_state_view(current_state)
+        snakes = {snake.player_id: [[x, y] for x, y in snake.segments] for snake in self.players}
+        beans = [[x, y] for x, y in self.beans_position]
+        directions = info_before.get('directions') if isinstance(info_before, dict) else None
+        directions = list(directions) if directions is not None else None
+        all_obs = []
+        for i in player_id_list:
+            key_info = dict(snakes)
+            key_info[1] = beans
+            key_info['state_map'] = state
+            key_info['board_width'] = self.board_width
+            key_info['board_height'] = self.board_height
+            key_info['last_direction'] = directions
+            key_info['controlled_snake_index'] = i
+            all_obs.append(key_info)
+        return all_obs
+
     def set_action_space(self):
         action_space = [[Discrete(4)] for _ in range(self.n_player)]
         return action_space
 
-    def reset(self):
+    def reset(self, seed=None):
+        if seed is not None:
+            self.rng_seed = seed
+            self.np_random = np.random.default_rng(seed)
         self.step_cnt = 1
         self.snakes_position = {}
         self.players = []
@@ -73,7 +109,7 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
 
     def init_state(self):
         for i in range(self.n_player):
-            s = Snake(i + 2, self.board_width, self.board_height, self.init_len)
+            s = Snake(i + 2, self.board_width, self.board_height, self.init_len, self.np_random)
             s_len = 1
             while s_len < self.init_len:
                 if s_len == 1 and i > 0:
@@ -83,11 +119,11 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
                 cur_head = s.move_and_add(self.snakes_position)
                 cur_hit = self.is_hit(cur_head, self.snakes_position) or self.is_hit(cur_head, {i:s.segments[1:]})
                 if origin_hit or cur_hit:
-                    x = random.randrange(0, self.board_height)
-                    y = random.randrange(0, self.board_width)
+                    x = int(self.np_random.integers(self.board_height))
+                    y = int(self.np_random.integers(self.board_width))
                     s.headPos = [x, y]
                     s.segments = [s.headPos]
-                    s.direction = random.choice(self.actions)
+                    s.direction = self.actions[self.np_random.integers(4)]
                     s_len = 1
                 else:
                     s_len += 1
@@ -153,7 +189,7 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
         new_bean_num = left_bean_num if left_valid_positions > left_bean_num else left_valid_positions
 
         if left_valid_positions > 0:
-            new_bean_positions_idx = np.random.choice(left_valid_positions, size=new_bean_num, replace=False)
+            new_bean_positions_idx = self.np_random.choice(left_valid_positions, size=new_bean_num, replace=False)
             new_bean_positions = all_valid_positions[new_bean_positions_idx]
         else:
             new_bean_positions = []
@@ -252,7 +288,7 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
                                     q.append([nx, ny])
                             if len(seg) == self.init_len:
                                 if len(seg) < 3:
-                                    snake.direction = random.choice(self.actions)
+                                    snake.direction = self.actions[self.np_random.integers(4)]
                                 elif len(seg) == 3:
                                     mid = ([seg[1][0], seg[2][1]], [seg[2][0], seg[1][1]])
                                     if seg[0] in mid:
@@ -338,14 +374,15 @@ class SnakeEatBeans(GridGame, GridObservation, DictObservation):
 
 
 class Snake:
-    def __init__(self, player_id, board_width, board_height, init_len):
+    def __init__(self, player_id, board_width, board_height, init_len, np_random):
         self.actions = [-2, 2, -1, 1]
         self.actions_name = {-2: "up", 2: "down", -1: "left", 1: "right"}
-        self.direction = random.choice(self.actions)  # 方向[-2,2,-1,1]分别表示[上，下，左，右]
+        self.np_random = np_random
+        self.direction = self.actions[np_random.integers(4)]  # 方向[-2,2,-1,1]分别表示[上，下，左，右]
         self.board_width = board_width
         self.board_height = board_height
-        x = random.randrange(0, board_height)
-        y = random.randrange(0, board_width)
+        x = int(np_random.integers(board_height))
+        y = int(np_random.integers(board_width))
         self.segments = [[x, y]]
         self.headPos = self.segments[0]
         self.player_id = player_id
@@ -360,9 +397,9 @@ class Snake:
         if act + self.direction != 0:
             self.direction = act
         else:
-            n_direct = random.choice(self.actions)
+            n_direct = self.actions[self.np_random.integers(4)]
             while n_direct + self.direction == 0:
-                n_direct = random.choice(self.actions)
+                n_direct = self.actions[self.np_random.integers(4)]
             self.direction = n_direct
 
     # 超过边界，可以穿越
@@ -0,0 +1,112 @@
+# -*- coding:utf-8  -*-
+import hashlib
+
+import numpy as np
+
+# Symmetries of the torus boards.  The boards wrap in both directions, so a
+# translation maps a position to a strategically identical one, and so do the
+# reflections of the rows and of the columns (the boards are not square, so there
+# are no quarter turns).  A transform is (flip_x, flip_y, dx, dy): cell (x, y) goes
+# to (+-x + dx, +-y + dy) modulo the board.  A reflection of the rows swaps the
+# actions up and down, one of the columns left and right; translations keep actions.
+#
+# Cells are x * width + y as in the bitboard engine.  The canonical form of a
+# position moves the head of one snake (the seat's) to cell 0 and takes the smallest
+# encoding over the four reflections, so every one of the 4 * width * height images
+# of a position has the same form.  Keys are a 64-bit hash of it (never 0), for
+# transposition tables, caches, opening books and deduplicating recorded games.
+#
+# The env regenerates a crashed snake at the first free cells in board order, which
+# no transform preserves; values that depend on where snakes regenerate (exact
+# endgame values) are not symmetric, search results and policies are.
+
+
+class TorusSymmetry(object):
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.flips = [(fx, fy) for fx in (0, 1) for fy in (0, 1)]
+
+    def transform_cell(self, cell, transform):
+        fx, fy, dx, dy = transform
+        x, y = divmod(cell, self.width)
+        x = ((-x if fx else x) + dx) % self.height
+        y = ((-y if fy else y) + dy) % self.width
+        return x * self.width + y
+
+    def inverse(self, transform):
+        fx, fy, dx, dy = transform
+        return fx, fy, (dx if fx else -dx) % self.height, (dy if fy else -dy) % self.width
+
+    def transform_action(self, action, transform):
+        # reflections are their own inverse, so this also maps canonical actions back
+        if transform[0 if action < 2 else 1]:
+            return action ^ 1
+        return action
+
+    def anchored(self, cell, fx, fy):
+        # the transform with reflections fx, fy that moves cell to cell 0
+        x, y = divmod(cell, self.width)
+        return fx, fy, (x if fx else -x) % self.height, (y if fy else -y) % self.width
+
+    def encode(self, bodies, beans, directions, transform):
+        cell = self.transform_cell
+        data = bytes(self.transform_action(d, transform) for d in directions)
+        for body in bodies:
+            data += bytes([len(body)]) + bytes(cell(c, transform) for c in body)
+        return data + bytes(sorted(cell(c, transform) for c in beans))
+
+    def canonical(self, bodies, beans, directions, anchor=0):
+        """
+        Canonical encoding (bytes) of the snakes' bodies (lists of cells, the head of
+        bodies[anchor] anchors the translation), the bean cells and the directions of
+        the snakes, and the transform that maps the position to it.  Cells fit a byte
+        on boards up to 256 cells.
+        """
+        head = bodies[anchor][0]
+        return min((self.encode(bodies, beans, directions, t), t)
+                   for t in (self.anchored(head, fx, fy) for fx, fy in self.flips))
+
+    def canonical_key(self, state, seat=0):
+        # (key, transform) of a bitboard engine state seen by seat
+        data, transform = self.canonical(state.bodies, bits(state.beans), state.directions, seat)
+        return hash_key(bytes([seat, state.step_cnt & 255]) + data), transform
+
+    def transform_position(self, beans, snakes, transform):
+        # beans and snakes as in the observation, [[x, y], ...]
+        def cell(pos):
+            return list(divmod(self.transform_cell(pos[0] * self.width + pos[1], transform), self.width))
+        return [cell(pos) for pos in beans], [[cell(pos) for pos in snake] for snake in snakes]
+
+    def transform_map(self, state_map, transform):
+        # a height x width state map (or anything indexed by [x][y]) in the new frame
+        fx, fy, dx, dy = transform
+        state_map = np.asarray(state_map)
+        rows = ((-np.arange(self.height) if fx else np.arange(self.height)) + dx) % self.height
+        cols = ((-np.arange(self.width) if fy else np.arange(self.width)) + dy) % self.width
+        result = np.empty_like(state_map)
+        result[np.ix_(rows, cols)] = state_map
+        return result
+
+
+def bits(mask):
+    # the cells of a bitboard
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(low.bit_length() - 1)
+        mask ^= low
+    return cells
+
+
+def hash_key(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little') | 1
+
+
+symmetries = {}
+
+
+def get_symmetry(width, height):
+    if (width, height) not in symmetries:
+        symmetries[(width, height)] = TorusSymmetry(width, height)
+    return symmetries[(width, height)]
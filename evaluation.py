@@ -1,13 +1,18 @@
 import numpy as np
 
-from agent.dqn.rl_agent import get_observations
+from agent.dqn.observation import get_observations
 from agent.greedy.greedy_agent import Cnt_d, greedy_snake
-from agent.dqn.rl_agent import agent as dqn_snake
 from agent.search.search_agent import search_snake
-from agent.greedy_old.greedy_old_agent import greedy_snake_old
+from agent.mcts.mcts_agent import mcts_snake
 from env.chooseenv import make
+from env.simulators.board_renderer import EpisodeWriter
+from util.decision_cache import DecisionCache, cached_decisions
+from util.sprt import SPRT
+from util.threads import configure_threads, parse_cpus, scaling_curve
 from tabulate import tabulate
 import argparse
+import contextlib
+import os
 import time
 
 def print_state(state, actions, step):
@@ -18,6 +23,7 @@ def print_state(state, actions, step):
     print(f'actions: {actions}\n')
 
 Cnt = 0
+search_workers = 0
 def get_actions(obs, algo, greedy_info, side):
 
     actions = np.random.randint(4, size=1)
@@ -29,11 +35,22 @@ def get_actions(obs, algo, greedy_info, side):
                                   greedy_info['beans'],
                                   greedy_info['snakes'],
                                   greedy_info['width'],
-                                  greedy_info['height'], side)[:]
+                                  greedy_info['height'], side, search_workers,
+                                  step_cnt=greedy_info['step'])[:]
         ed= time.time()
         if (ed-start>=1): print ("TLE")
         # print(ed-start)
+    elif algo == 'mcts':
+        start= time.time()
+        actions[:]= mcts_snake(greedy_info['beans'],
+                               greedy_info['snakes'],
+                               greedy_info['width'],
+                               greedy_info['height'], side, greedy_info['step'])[:]
+        ed= time.time()
+        if (ed-start>=1): print ("TLE")
     elif algo == 'dqn':
+        # torch is only imported when a DQN agent plays
+        from agent.dqn.rl_agent import agent as dqn_snake
         actions[:] = dqn_snake.choose_action([obs])
     elif algo == 'greedy':
         global Cnt
@@ -47,8 +64,11 @@ def get_actions(obs, algo, greedy_info, side):
                                   greedy_info['beans'],
                                   greedy_info['snakes'],
                                   greedy_info['width'],
-                                  greedy_info['height'], ctrl_agent_index, Cnt)[:]
+                                  greedy_info['height'], ctrl_agent_index, greedy_info['step'],
+                                  step_cnt=greedy_info['step'])[:]
     elif algo == "greedy_old":
+        # the old greedy agent is not part of this tree, only imported when asked for
+        from agent.greedy_old.greedy_old_agent import greedy_snake_old
         if side == 0:
             ctrl_agent_index = [0]
         else:
@@ -78,12 +98,13 @@ def join_actions(obs, algo_list, greedy_info):
     first_action = get_actions(obs[0], algo_list[0], greedy_info, side=0)
     second_action = get_actions(obs[1], algo_list[1], greedy_info, side=1)
     actions = np.zeros(2)
-    actions[0] = first_action[:]
-    actions[1] = second_action[:]
+    actions[0] = first_action[0]
+    actions[1] = second_action[0]
     return actions
 
 
-def run_game(env, algo_list, episode, verbose=False):
+def run_game(env, algo_list, episode, verbose=False, render_dir=None, render_format='gif', seed=None, sprt=None):
+    # with an SPRT the run stops once it accepts a hypothesis about algo_list[0]'s score, or after episode games
     width = env.board_width
     height = env.board_height
     obs_dim = 65
@@ -94,11 +115,16 @@ def run_game(env, algo_list, episode, verbose=False):
     for i in range(1, episode + 1):
         print(i)
         episode_reward = np.zeros(2)
-        state, info = env.reset()
+        # game i of a seeded run starts from seed + i - 1
+        state, info = env.reset(None if seed is None else seed + i - 1)
         obs = get_observations(state, info, agent_index, obs_dim, height, width, 0)
+        writer = None
+        if render_dir:
+            writer = EpisodeWriter(os.path.join(render_dir, 'game_%d.%s' % (i, render_format)), env.renderer)
+            writer.add(env.get_render_data(state))
 
         greedy_info = {'state': np.squeeze(np.array(state), axis=2), 'beans': info['beans_position'],
-                       'snakes': info['snakes_position'], 'width': width, 'height': height}
+                       'snakes': info['snakes_position'], 'width': width, 'height': height, 'step': env.step_cnt}
 
         action_list = join_actions(obs, algo_list, greedy_info)
         joint_action = env.encode(action_list)
@@ -110,13 +136,22 @@ def run_game(env, algo_list, episode, verbose=False):
         while True:
             next_state, reward, done, _, info = env.step(joint_action)
             episode_reward += reward
+            if writer is not None:
+                writer.add(env.get_render_data(next_state))
             if done:
+                if writer is not None:
+                    writer.close()
                 if np.sum(episode_reward[0]) > np.sum(episode_reward[1]):
                     num_win[0] += 1
+                    result = 1
                 elif np.sum(episode_reward[0]) < np.sum(episode_reward[1]):
                     num_win[1] += 1
+                    result = 0
                 else:
                     num_win[2] += 1
+                    result = 0.5
+                if sprt is not None:
+                    sprt.add(result)
 
                 if not verbose:
                     print('.', end='')
@@ -129,7 +164,7 @@ def run_game(env, algo_list, episode, verbose=False):
             obs = get_observations(state, info, agent_index, obs_dim, height, width, step)
 
             greedy_info = {'state': np.squeeze(np.array(state), axis=2), 'beans': info['beans_position'],
-                           'snakes': info['snakes_position'], 'width': width, 'height': height}
+                           'snakes': info['snakes_position'], 'width': width, 'height': height, 'step': env.step_cnt}
 
             action_list = join_actions(obs, algo_list, greedy_info)
             joint_action = env.encode(action_list)
@@ -138,8 +173,12 @@ def run_game(env, algo_list, episode, verbose=False):
                 print_state(state, action_list, step)
 
         total_reward += episode_reward
+        if sprt is not None and sprt.status() is not None:
+            print()
+            break
     # print("B")
     # calculate results
+    episode = i
     total_reward /= episode
     print(f'\nResult base on {episode} ', end='')
     print('episode:') if episode == 1 else print('episodes:')
@@ -148,6 +187,22 @@ def run_game(env, algo_list, episode, verbose=False):
     data = [['score', total_reward[0], total_reward[1]],
             ['win', num_win[0], num_win[1]]]
     print(tabulate(data, headers=header, tablefmt='pretty', floatfmt='.3f'))
+    if sprt is not None:
+        status = sprt.status()
+        verdict = {'H1': 'H1 accepted, score >= %g' % sprt.p1, 'H0': 'H0 accepted, score <= %g' % sprt.p0,
+                   None: 'undecided'}[status]
+        mean = sprt.score()[0]
+        low, high = sprt.interval()
+        print("SPRT %s after %d games: LLR %.2f in (%.2f, %.2f), %s score %.3f, %g%% interval [%.3f, %.3f]" % (
+            verdict, sprt.games, sprt.llr(), sprt.lower, sprt.upper, algo_list[0], mean,
+            100 * sprt.confidence, low, high))
+
+def count_games(env_type, algo_list, episode):
+    # run_game without its output, for throughput measurements
+    with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+        run_game(make(env_type, conf=None), algo_list, episode)
+    return episode
+
 
 if __name__ == "__main__":
     env_type = 'snakes_1v1'
@@ -155,11 +210,59 @@ if __name__ == "__main__":
     game = make(env_type, conf=None)
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("--my_ai", default="greedy", help="dqn/random/greedy")
-    parser.add_argument("--opponent", default="greedy_old", help="dqn/random/greedy")
-    parser.add_argument("--episode", default=1000)
+    parser.add_argument("--my_ai", default="greedy", help="dqn/random/greedy/search/mcts")
+    parser.add_argument("--opponent", default="greedy_old", help="dqn/random/greedy/search/mcts")
+    parser.add_argument("--episode", default=1000, type=int, help="games to play, the most with --sprt")
+    parser.add_argument("--search_workers", default=0, type=int, help="worker processes for root-parallel search")
+    parser.add_argument("--render_dir", default=None, help="write every game as an animation to this directory")
+    parser.add_argument("--render_format", default="gif", help="gif/mp4")
+    parser.add_argument("--threads", default=None, type=int, help="torch / OpenMP threads per process")
+    parser.add_argument("--interop_threads", default=None, type=int, help="torch inter-op threads per process")
+    parser.add_argument("--cpus", default=None, help="cpus to run on, e.g. 0-3,6")
+    parser.add_argument("--pin", action="store_true", help="pin every scaling process to its own cpus")
+    parser.add_argument("--scaling", default=None,
+                        help="process counts, e.g. 1,2,4: report games/s as the number of processes varies")
+    parser.add_argument("--sprt", action="store_true", help="stop when a sequential test decides --p0 vs --p1")
+    parser.add_argument("--p0", default=0.5, type=float, help="SPRT H0: the expected score of my_ai (win 1, draw 0.5)")
+    parser.add_argument("--p1", default=0.55, type=float, help="SPRT H1: the expected score of my_ai")
+    parser.add_argument("--alpha", default=0.05, type=float, help="SPRT chance of accepting H1 when H0 holds")
+    parser.add_argument("--beta", default=0.05, type=float, help="SPRT chance of accepting H0 when H1 holds")
+    parser.add_argument("--confidence", default=0.95, type=float, help="level of the reported score interval")
+    parser.add_argument("--seed", default=None, type=int, help="seed of the first game, the rest follow")
+    parser.add_argument("--cache_mb", default=0, type=float,
+                        help="memoize the moves of the deterministic agents, greedy and search without "
+                             "--search_workers, in an LRU cache; mcts is never cached")
+    parser.add_argument("--cache_file", default=None, help="load the move cache from and save it to this file")
+    parser.add_argument("--cache_symmetric", action="store_true",
+                        help="key canonical positions, so symmetric ones share moves. Moves can then change: "
+                             "a reflected position replays the cached move, not the one the agent would pick, "
+                             "and results can differ from an uncached run")
     args = parser.parse_args()
+    configure_threads(args.threads, args.interop_threads, None if args.pin else args.cpus)
+    search_workers = args.search_workers
+    if args.render_dir:
+        os.makedirs(args.render_dir, exist_ok=True)
 
     # [greedy, dqn, random]
     agent_list = [args.my_ai, args.opponent]
-    run_game(game, algo_list=agent_list, episode=args.episode, verbose=False)
\ No newline at end of file
+    if args.scaling:
+        # every process plays --episode games with --threads threads
+        rows = scaling_curve(count_games, (env_type, agent_list, int(args.episode)),
+                             [int(n) for n in args.scaling.split(',')], args.threads or 1,
+                             args.interop_threads or 1, parse_cpus(args.cpus), args.pin)
+        print(tabulate(rows, headers=['processes', 'games/s', 'speedup', 'efficiency'], floatfmt='.3f'))
+        exit()
+    decision_cache = None
+    if args.cache_mb:
+        decision_cache = DecisionCache(args.cache_mb, args.cache_file)
+        # search_snake passes root-parallel calls through, mcts_snake is not deterministic
+        search_snake = cached_decisions(search_snake, decision_cache, args.cache_symmetric)
+        greedy_snake = cached_decisions(greedy_snake, decision_cache, args.cache_symmetric)
+    run_game(game, algo_list=agent_list, episode=args.episode, verbose=False, render_dir=args.render_dir,
+             render_format=args.render_format, seed=args.seed,
+             sprt=SPRT(args.p0, args.p1, args.alpha, args.beta, confidence=args.confidence) if args.sprt else None)
+    if decision_cache is not None:
+        print("move cache: {hits} hits, {misses} misses ({hit_rate:.1%}), {entries} entries, "
+              "{evictions} evicted, {mb:.1f} MB".format(**decision_cache.stats()))
+        if args.cache_file:
+            decision_cache.save()
\ No newline at end of file
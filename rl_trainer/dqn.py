@@ -1,4 +1,5 @@
 import os.path
+import time
 
 import torch
 import torch.nn as nn
@@ -6,6 +7,8 @@ import torch.nn.functional as F
 import torch.optim as optim
 import random
 from agent.greedy.greedy_agent import greedy_snake
+from agent.dqn.numpy_critic import load_weights
+from rl_trainer.utils import hard_update, soft_update
 import numpy as np
 
 class Critic(nn.Module):
@@ -24,6 +27,43 @@ class Critic(nn.Module):
         return x
 
 
+class TransitionBuffer(object):
+    """
+    Ring buffer of transitions in preallocated float32 arrays, shared with the tensors
+    sample() indexes, so a minibatch is a few contiguous gathers instead of stacking
+    tuples of arrays. Only the first controlled snake's action is kept.
+    """
+
+    def __init__(self, capacity, state_dim):
+        self.capacity = capacity
+        self.obs = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.action = np.zeros(capacity, dtype=np.int64)
+        self.reward = np.zeros(capacity, dtype=np.float32)
+        self.obs_ = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.done = np.zeros(capacity, dtype=np.float32)
+        self.tensors = [torch.from_numpy(a) for a in (self.obs, self.action, self.reward, self.obs_, self.done)]
+        self.pos = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def store(self, transition):
+        obs, action, reward, obs_, done = transition
+        i = self.pos
+        self.obs[i] = np.reshape(obs, -1)
+        self.action[i] = np.reshape(action, -1)[0]
+        self.reward[i] = np.reshape(reward, -1)[0]
+        self.obs_[i] = np.reshape(obs_, -1)
+        self.done[i] = np.reshape(done, -1)[0]
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def sample(self, batch_size):
+        index = torch.randint(self.size, (batch_size,))
+        return [t[index] for t in self.tensors]
+
+
 class DQN(object):
     def __init__(self, state_dim, action_dim, num_agent, args):
         self.state_dim = state_dim
@@ -41,8 +81,15 @@ class DQN(object):
         self.critic_target = Critic(self.state_dim, self.action_dim, self.hidden_size)
         self.optimizer = optim.Adam(self.critic_eval.parameters(), lr=self.lr)
 
-        self.buffer = []
+        self.buffer = TransitionBuffer(self.buffer_size, self.state_dim)
         self.loss = None
+        # updates per environment step, Polyak averaging of the target when tau is set, hard copies otherwise
+        self.replay_ratio = getattr(args, 'replay_ratio', 1)
+        if self.replay_ratio < 1:
+            raise Exception("replay_ratio must be at least 1, got %s" % self.replay_ratio)
+        self.tau = getattr(args, 'tau', None) or 0
+        self.n_updates = 0
+        self.update_time = 0.0
 
         # epsilon
         self.eps = args.epsilon
@@ -76,56 +123,44 @@ class DQN(object):
         return action
 
     def store_transition(self, transition):
-        if len(self.buffer) == self.buffer_size:
-            self.buffer.pop(0)
-        self.buffer.append(transition)
+        self.buffer.store(transition)
 
     def learn(self):
+        # replay_ratio gradient updates per environment step
         if len(self.buffer) < self.batch_size:
             return
 
-        samples = random.sample(self.buffer, self.batch_size)
-        obs, action, reward, obs_, done = zip(*samples)
-
-        obs = torch.tensor(obs, dtype=torch.float).squeeze()
-        action = torch.tensor(action, dtype=torch.long).view(self.batch_size, -1)
-        reward = torch.tensor(reward, dtype=torch.float).view(self.batch_size, -1).squeeze()
-        obs_ = torch.tensor(obs_, dtype=torch.float).squeeze()
-        done = torch.tensor(done, dtype=torch.float).view(self.batch_size, -1).squeeze()
-
-        '''obs = torch.tensor(obs, dtype=torch.float).squeeze()
-        action = torch.tensor(action, dtype=torch.long).view(self.batch_size, -1)
-        reward = torch.tensor(reward, dtype=torch.float)
-        obs_ = torch.tensor(obs_, dtype=torch.float).squeeze()
-        done = torch.tensor(done, dtype=torch.float)'''
-
-        q_eval = self.critic_eval(obs).gather(1, action)
-        q_next = self.critic_target(obs_).detach()
-        q_target = (reward + self.gamma * q_next.max(1)[0] * (1 - done)).view(self.batch_size, 1)
-        loss_fn = nn.MSELoss()
-        loss = loss_fn(q_eval, q_target)
-        '''q_eval = self.critic_eval(obs).gather(1, action)
-        q_eval_next = self.critic_eval(obs_)
-        max_action = torch.argmax(q_eval_next, dim=1).unsqueeze(1)
-        q_next = self.critic_target(obs_).gather(1, max_action).detach()
-        q_target = (reward + self.gamma * q_next * (1 - done)).view(self.batch_size, 1)'''
-
-        loss_fn = nn.MSELoss()
-        loss = loss_fn(q_eval, q_target)
-
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
-
-        if self.learn_step_counter % self.target_replace_iter == 0:
-            self.learn_step_counter = 0
-            self.critic_target.load_state_dict(self.critic_eval.state_dict())
-        self.learn_step_counter += 1
-
+        start = time.perf_counter()
+        for _ in range(self.replay_ratio):
+            obs, action, reward, obs_, done = self.buffer.sample(self.batch_size)
+
+            q_eval = self.critic_eval(obs).gather(1, action.unsqueeze(1)).squeeze(1)
+            with torch.no_grad():
+                # reward + gamma * max_a Q_target(obs_, a) * (1 - done) in one fused op
+                q_target = torch.addcmul(reward, self.critic_target(obs_).max(1)[0], 1 - done, value=self.gamma)
+            loss = F.mse_loss(q_eval, q_target)
+
+            self.optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            self.optimizer.step()
+
+            if self.tau > 0:
+                soft_update(self.critic_eval, self.critic_target, self.tau)
+            elif self.learn_step_counter % self.target_replace_iter == 0:
+                self.learn_step_counter = 0
+                hard_update(self.critic_eval, self.critic_target)
+            self.learn_step_counter += 1
+
+        self.n_updates += self.replay_ratio
+        self.update_time += time.perf_counter() - start
         self.loss = loss.item()
 
         return loss
 
+    @property
+    def updates_per_second(self):
+        return self.n_updates / self.update_time if self.update_time else 0.0
+
     def save(self, run_dir, episode):
         base_path = os.path.join(run_dir, 'trained_model')
         if not os.path.exists(base_path):
@@ -137,5 +172,10 @@ class DQN(object):
     def load(self, file):
         base_path = os.path.dirname(os.path.abspath(__file__))
         file = os.path.join(base_path, file)
-        self.critic_eval.load_state_dict(torch.load(file))
-        self.critic_target.load_state_dict(torch.load(file))
+        if file.endswith('.npz'):
+            # numpy export, float32 or int8
+            state_dict = {k: torch.from_numpy(v) for k, v in load_weights(file).items()}
+        else:
+            state_dict = torch.load(file)
+        self.critic_eval.load_state_dict(state_dict)
+        self.critic_target.load_state_dict(self.critic_eval.state_dict())
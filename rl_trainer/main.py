@@ -10,6 +10,7 @@ from dqn import DQN
 from env.chooseenv import make
 from agent.greedy.greedy_agent import greedy_snake
 from tensorboardX import SummaryWriter
+from util.threads import configure_threads
 
 import numpy as np
 import random
@@ -17,6 +18,7 @@ import torch
 
 # Cnt = 0
 def main(args):
+    configure_threads(args.threads, args.interop_threads, args.cpus)
     env = make('snakes_1v1', conf=None)
     game_name = args.game_name
     print(f'game name: {args.game_name}')
@@ -37,6 +39,7 @@ def main(args):
     torch.manual_seed(args.seed_nn)
     np.random.seed(args.seed_np)
     random.seed(args.seed_random)
+    env.reset(seed=args.seed_np)
 
     # 定义保存路径
     run_dir, log_dir = make_logpath(game_name, args.algo)
@@ -55,24 +58,28 @@ def main(args):
     model = DQN(obs_dim, action_dim, ctrl_agent_num, args)
     episode = 0
 
+    # num_envs games run in lockstep so that the greedy opponent decides all of them
+    # in one batch; every game's transitions go to the same buffer
+    envs = [env] + [make('snakes_1v1', conf=None) for _ in range(args.num_envs - 1)]
+    for k in range(1, args.num_envs):
+        envs[k].reset(seed=args.seed_np + k)
+    games = []
+    for k in range(args.num_envs):
+        state, info = envs[k].reset()
+        games.append([state, info, get_observations(state, info, ctrl_agent_index, obs_dim, height, width, 0),
+                      0, np.zeros(2)])
+
     while episode < args.max_episodes:
-        state, info = env.reset()
-        obs = get_observations(state, info, ctrl_agent_index, obs_dim, height, width, 0)
-
-        episode += 1
-        step = 0
-        episode_reward = np.zeros(2)
-
-        while True:
-            action = model.choose_action(obs, state, info, width, height, step)
-            # actions = append_random(action_dim, action)
-            # beans = info['beans_position']
-            # snakes = info['snakes_position']
-            # actions = greedy_snake(np.squeeze(np.array(state), axis=2), beans, snakes, width, height, [1])
-            # actions = model.choose_action(obs)
-            actions = append_greedy(action_dim, state, info, action, height, width, step)
+        action = [np.reshape(model.choose_action(obs, state, info, width, height, step), -1)[0]
+                  for state, info, obs, step, _ in games]
+        # actions = append_random(action_dim, action)
+        # actions = append_greedy(action_dim, state, info, action, height, width, step)
+        joint = append_greedy_batch(action_dim, [g[0] for g in games], [g[1] for g in games], action,
+                                    height, width, [g[3] for g in games])
+        for k, (state, info, obs, step, episode_reward) in enumerate(games):
+            actions = joint[k]
             snakes_cur = info['snakes_position']
-            next_state, reward, done, _, info = env.step(env.encode(actions))
+            next_state, reward, done, _, info = envs[k].step(envs[k].encode(actions))
             snakes_next = info['snakes_position']
             reward = np.array(reward)
             episode_reward += reward
@@ -96,11 +103,11 @@ def main(args):
             trans = Transition(obs, actions, step_reward, np.array(next_obs), done)
             model.store_transition(trans)
             model.learn()
-            obs = next_obs
-            state = next_state
             step += 1
+            games[k] = [next_state, info, next_obs, step, episode_reward]
 
             if args.episode_length <= step or (True in done):
+                episode += 1
                 print(f'[Episode {episode:05d}] score: {episode_reward[0]} reward: {step_reward[0]:.2f}')
 
                 reward_tag = 'reward'
@@ -110,13 +117,15 @@ def main(args):
                 if model.loss:
                     writer.add_scalars(loss_tag, global_step=episode,
                                        tag_scalar_dict={'loss': model.loss})
-                    print(f'\t\t\t\tloss {model.loss:.3f}')
+                    writer.add_scalar('updates_per_second', model.updates_per_second, global_step=episode)
+                    print(f'\t\t\t\tloss {model.loss:.3f} updates/s {model.updates_per_second:.0f}')
 
                 if episode % args.save_interval == 0:
                     model.save(run_dir, episode)
 
-                env.reset()
-                break
+                state, info = envs[k].reset()
+                games[k] = [state, info, get_observations(state, info, ctrl_agent_index, obs_dim, height, width, 0),
+                            0, np.zeros(2)]
 
 
 if __name__ == '__main__':
@@ -136,7 +145,9 @@ if __name__ == '__main__':
     # algo
     parser.add_argument('--output_activation', default='softmax', type=str, help='tanh/softmax')
     parser.add_argument('--buffer_size', default=int(1e5), type=int)
-    parser.add_argument('--tau', default=0.001, type=float)
+    parser.add_argument('--tau', default=None, type=float, help='Polyak averaging of the target (e.g. 0.001), unset copies it every target_replace updates')
+    parser.add_argument('--replay_ratio', default=1, type=int, help='gradient updates per environment step, at least 1')
+    parser.add_argument('--num_envs', default=1, type=int, help='games played in lockstep, the greedy opponent moves in all of them in one batch')
     parser.add_argument('--gamma', default=0.95, type=float)
     parser.add_argument('--lr_a', default=0.05, type=float)
     parser.add_argument('--lr_c', default=0.05, type=float)
@@ -155,5 +166,10 @@ if __name__ == '__main__':
     # evaluation
     parser.add_argument('--evaluate_rate', default=50)
 
+    # threads
+    parser.add_argument('--threads', default=None, type=int, help='torch intra-op threads of the learner')
+    parser.add_argument('--interop_threads', default=None, type=int, help='torch inter-op threads')
+    parser.add_argument('--cpus', default=None, help='pin the trainer to these cpus, e.g. 0-3')
+
     args = parser.parse_args()
     main(args)
@@ -10,6 +10,7 @@ import sys
 base_dir = Path(__file__).resolve().parent.parent
 sys.path.append(str(base_dir))
 from agent.greedy.greedy_agent import greedy_snake
+from agent.greedy.greedy_batch import greedy_snake_batch
 from types import SimpleNamespace as SN
 import yaml
 import math
@@ -23,8 +24,11 @@ def hard_update(source, target):
 
 
 def soft_update(source, target, tau):
-    for src_param, tgt_param in zip(source.parameters(), target.parameters()):
-        tgt_param.data.copy_(tgt_param.data * (1.0 - tau) + src_param.data * tau)
+    # in place: target = (1 - tau) * target + tau * source
+    with torch.no_grad():
+        tgt_params = list(target.parameters())
+        torch._foreach_mul_(tgt_params, 1.0 - tau)
+        torch._foreach_add_(tgt_params, list(source.parameters()), alpha=tau)
 
 
 Activation = Union[str, nn.Module]
@@ -252,7 +256,7 @@ def append_greedy(act_dim, state, info, action, height, width, step):
 
     action = torch.Tensor([action]).to(device)
     logits_action = np.array([out for out in action])
-    greedy_action = greedy_snake(state, beans, snakes, width, height, [1], step)
+    greedy_action = greedy_snake_batch([state], [beans], [snakes], width, height, 1, step)
     
     action_list = np.zeros(2)
     action_list[0] = logits_action[0]
@@ -260,6 +264,19 @@ def append_greedy(act_dim, state, info, action, height, width, step):
 
     return action_list
 
+def append_greedy_batch(act_dim, states, infos, actions, height, width, steps):
+    # one greedy opponent action per parallel environment, computed in a single batch
+    states = [np.squeeze(np.array(state), axis=2) for state in states]
+    beans = [info['beans_position'] for info in infos]
+    snakes = [info['snakes_position'] for info in infos]
+    greedy_action = greedy_snake_batch(states, beans, snakes, width, height, 1, steps)
+
+    action_list = np.zeros((len(states), 2))
+    action_list[:, 0] = actions
+    action_list[:, 1] = greedy_action
+
+    return action_list
+
 def get_surrounding(state, width, height, x, y):
     surrounding = [state[(y - 1) % height][x],  # up
                    state[(y + 1) % height][x],  # down
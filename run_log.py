@@ -3,24 +3,12 @@ import time
 import json
 from env.chooseenv import make
 from util.get_logger import get_logger
+from util.agent_server import AgentServer
+from util.game_log import GameLogWriter, NpEncoder
 from env.obs_interfaces.observation import obs_type
 import argparse
-import numpy as np
 from copy import deepcopy
 
-class NpEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        else:
-            return super(NpEncoder, self).default(obj)
-
-
-
 def get_players_and_action_space_list(g):
     if sum(g.agent_nums) != g.n_player:
         raise Exception("agent number = %d 不正确，与n_player = %d 不匹配" % (sum(g.agent_nums), g.n_player))
@@ -45,6 +33,17 @@ def get_players_and_action_space_list(g):
     return players_id, actions_space
 
 
+agent_servers = {}
+
+
+def get_agent_server(function_name, policy):
+    # one warm worker per seat, kept across games
+    key = (function_name, policy)
+    if key not in agent_servers:
+        agent_servers[key] = AgentServer(policy)
+    return agent_servers[key]
+
+
 def get_joint_action_eval(game, player_ids, policy_list, actions_spaces, info_before):
     if len(policy_list) != len(game.agent_nums):
         error = "模型个数%d与玩家个数%d维度不正确！" % (len(policy_list), len(game.agent_nums))
@@ -59,16 +58,18 @@ def get_joint_action_eval(game, player_ids, policy_list, actions_spaces, info_be
 
         players_id_list = player_ids[policy_i]
 
+        # grid and dict observations are read-only views, only vector ones are copied
         if game.obs_type[policy_i] == "grid":
-            obs_list = game.get_grid_many_observation(game.current_state, players_id_list, info_before)
+            obs_list_togo = game.get_grid_many_observation(game.get_state_view(game.current_state),
+                                                           players_id_list, info_before)
         elif game.obs_type[policy_i] == "vector":
             obs_list = game.get_vector_many_observation(game.current_state, players_id_list, info_before)
+            obs_list_togo = deepcopy(obs_list)
         elif game.obs_type[policy_i] == "dict":
-            obs_list = game.get_dict_many_observation(game.current_state, players_id_list, info_before)
+            obs_list_togo = game.get_dict_many_view(game.current_state, players_id_list, info_before)
 
         action_space_list = actions_spaces[policy_i]
         function_name = 'm%d' % policy_i
-        obs_list_togo = deepcopy(obs_list)
         each = eval(function_name)(obs_list_togo, action_space_list, game.is_act_continuous)
 
         if len(each) != game.agent_nums[policy_i]:
@@ -84,7 +85,7 @@ def run_game(g, env_name, player_ids, actions_spaces, policy_list):
     This function is used to generate log for Vue rendering. Saves .json file
     """
     log_path = os.getcwd() + '/logs/'
-    logger = get_logger(log_path, g.game_name, json_file=render_mode)
+    logger = get_logger(log_path, g.game_name, json_file=render_mode and not stream_log)
 
     for i in range(len(policy_list)):
         if policy_list[i] not in get_valid_agents():
@@ -96,18 +97,32 @@ def run_game(g, env_name, player_ids, actions_spaces, policy_list):
             raise Exception("file {} not exist!".format(file_path))
         import_path = '.'.join(file_path.split('/')[-3:])[:-3]
         function_name = 'm%d' % i
+        if use_server:
+            globals()[function_name] = get_agent_server(function_name, policy_list[i])
+            continue
         import_name = "my_controller"
         import_s = "from %s import %s as %s" % (import_path, import_name, function_name)
         exec(import_s, globals())
 
+    writers = []
     if not g.is_obs_continuous:
         st = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
-        game_info = {"game_name": env_name, "n_player": g.n_player, "policies": policy_list,
+        game_info = {"game_name": env_name, "n_player": g.n_player, "policies": policy_list, "seed": g.rng_seed,
                      "board_height": g.board_height if hasattr(g, "board_height") else None,
                      "board_width": g.board_width if hasattr(g, "board_width") else None,
                      "init_info": g.init_info,
                      "start_time": st,
                      "mode": "terminal"}
+        # streamed logs are written step by step instead of as one JSON line at the end
+        now = time.time()
+        log_name = log_path + time.strftime('%Y%m%d%H%M%S', time.localtime(now)) + '%03d' % (now * 1000 % 1000) \
+            + '_' + g.game_name
+        if stream_log:
+            writers.append(GameLogWriter(log_name + '.jsonl', 'jsonl', compression))
+        if replay_log:
+            writers.append(GameLogWriter(log_name + '.replay', 'replay', compression))
+        for writer in writers:
+            writer.start(g, game_info)
 
     steps = []
     info_before = ''
@@ -126,17 +141,21 @@ def run_game(g, env_name, player_ids, actions_spaces, policy_list):
             info_dict["reward"] = reward
             if info_after:
                 info_dict["info_after"] = info_after
-            steps.append(info_dict)
+            if not stream_log:
+                steps.append(info_dict)
+            for writer in writers:
+                writer.step(g, joint_act, info_dict)
 
     if not g.is_obs_continuous:
-        game_info["steps"] = steps
-        game_info["winner"] = g.check_win()
-        game_info["winner_information"] = g.won
-        game_info["n_return"] = g.n_return
-        ed = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
-        game_info["end_time"] = ed
-        logs = json.dumps(game_info, ensure_ascii=False, cls=NpEncoder)
-        logger.info(logs)
+        result = {"winner": g.check_win(), "winner_information": g.won, "n_return": g.n_return,
+                  "end_time": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))}
+        for writer in writers:
+            writer.finish(result)
+        if not stream_log:
+            game_info["steps"] = steps
+            game_info.update(result)
+            logs = json.dumps(game_info, ensure_ascii=False, cls=NpEncoder)
+            logger.info(logs)
 
 
 def get_valid_agents():
@@ -144,6 +163,11 @@ def get_valid_agents():
     return [f for f in os.listdir(dir_path) if f != "__pycache__"]
 
 
+use_server = False
+replay_log = False
+stream_log = False
+compression = None
+
 if __name__ == "__main__":
     env_type = "snakes_1v1"
     game = make(env_type)
@@ -153,7 +177,18 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--my_ai", default="greedy", help="dqn/random/greedy")
     parser.add_argument("--opponent", default="greedy_old", help="dqn/random/greedy")
+    parser.add_argument("--server", action="store_true", help="run every agent in a persistent worker process")
+    parser.add_argument("--replay", action="store_true", help="also save a compact binary replay of the game")
+    parser.add_argument("--stream", action="store_true", help="write the game as JSON Lines while it is played")
+    parser.add_argument("--compress", default=None, choices=["gzip", "zstd"], help="compress streamed logs")
+    parser.add_argument("--seed", default=None, type=int, help="seed of the game's random number generator")
     args = parser.parse_args()
+    use_server = args.server
+    replay_log = args.replay
+    stream_log = args.stream
+    compression = args.compress
+    if args.seed is not None:
+        game.reset(seed=args.seed)
 
     policy_list = [args.my_ai, args.opponent]
 
@@ -0,0 +1,53 @@
+# -*- coding:utf-8  -*-
+import pytest
+
+from env.chooseenv import make
+
+
+def self_play(controller, games=2, seed=0):
+    # both seats of snakes_1v1 played by one controller, the env's step at every call
+    env = make('snakes_1v1')
+    steps = []
+    for game in range(games):
+        env.reset(seed=seed + game)
+        info_before = ''
+        while not env.is_terminal():
+            joint_action = []
+            for observation in env.get_dict_many_view(env.current_state, [0, 1], info_before):
+                steps.append(env.step_cnt)
+                joint_action.extend(controller([observation], [None]))
+            info_before = env.step(joint_action)[3]
+    return steps
+
+
+@pytest.mark.parametrize('module, searched', [('agent.mcts.mcts_agent', 'mcts_snake'),
+                                              ('agent.search.search_agent', 'search_snake')])
+def test_seats_see_the_env_step(monkeypatch, module, searched):
+    agent = __import__(module, fromlist=['my_controller'])
+    seen = []
+
+    def search(*args, **kwargs):
+        seen.append(kwargs['step_cnt'] if 'step_cnt' in kwargs else args[-1])
+        return [0]
+    monkeypatch.setattr(agent, searched, search)
+    steps = self_play(agent.my_controller)
+    assert seen == steps
+
+
+@pytest.mark.parametrize('module', ['agent.dqn.submission', 'agent.dqn.rl_agent'])
+def test_dqn_step_feature_restarts(monkeypatch, module):
+    if module == 'agent.dqn.rl_agent':
+        pytest.importorskip('torch')
+    controller = __import__(module, fromlist=['my_controller'])
+    critic = controller.critic if hasattr(controller, 'critic') else controller.agent
+    choose_actions = critic.choose_actions
+    seen = []
+
+    def choose(observations):
+        seen.extend(observations[:, 38])
+        return choose_actions(observations)
+    monkeypatch.setattr(critic, 'choose_actions', choose)
+    steps = self_play(controller.my_controller)
+    # the step feature counts from 0 in each game and for each seat
+    assert seen == [step - 1 for step in steps]
+    assert seen.count(0) == 4
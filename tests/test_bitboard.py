@@ -0,0 +1,47 @@
+# -*- coding:utf-8  -*-
+import math
+from collections import deque
+
+import numpy as np
+import pytest
+
+from common.bitboard import snake_reach
+
+
+def bfs(state, X, Y, width, height):
+    # the queue flood fill keep_safe and diji ran before the bitboards: distances from
+    # (X, Y) over cells without a snake, the source itself may be one
+    dist = np.full((height, width), math.inf)
+    dist[X][Y] = 0
+    q = deque([(X, Y)])
+    while q:
+        x, y = q.popleft()
+        for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            x1, y1 = (x + dx) % height, (y + dy) % width
+            if state[x1][y1] < 2 and dist[x1][y1] == math.inf:
+                dist[x1][y1] = dist[x][y] + 1
+                q.append((x1, y1))
+    return dist
+
+
+def random_board(rng, width, height):
+    # beans and two snakes of random cells; only the heads and the walls matter here
+    state = rng.choice([0, 0, 0, 1, 2, 3], size=(height, width))
+    cells = rng.permutation(width * height)[:2]
+    snakes = []
+    for i, c in enumerate(cells):
+        x, y = divmod(int(c), width)
+        state[x][y] = i + 2
+        snakes.append([[x, y]])
+    return state, snakes
+
+
+@pytest.mark.parametrize('width, height', [(8, 6), (20, 10)])
+def test_snake_reach_matches_bfs(width, height):
+    rng = np.random.RandomState(0)
+    for _ in range(200):
+        state, snakes = random_board(rng, width, height)
+        for snake, (size, dist) in zip(snakes, snake_reach(state, snakes, width, height)):
+            expected = bfs(state, snake[0][0], snake[0][1], width, height)
+            assert np.array_equal(dist, expected)
+            assert size == np.count_nonzero(expected < math.inf)
@@ -0,0 +1,28 @@
+# -*- coding:utf-8  -*-
+import random
+
+import pytest
+
+from env.bitboard_snakes import BitboardSnakes
+from env.chooseenv import make
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_step_matches_env(seed):
+    # a random non-reversing game through the env and the bitboard engine, compared after every step
+    env = make('snakes_1v1')
+    rng = random.Random(seed)
+    engine = BitboardSnakes(env.board_width, env.board_height, env.max_step, env.init_len)
+    env.reset(seed=seed)
+    state = engine.from_env(env)
+    while not env.is_terminal():
+        actions = [rng.choice([a for a in range(4) if a ^ 1 != d]) for d in state.directions]
+        _, reward, _, _, info = env.step(env.encode(actions))
+        state, bit_reward, hit = engine.step(state, actions)
+        # eaten beans are not respawned by the engine, the env's new ones are taken over
+        left = engine.beans(state)
+        assert all(bean in env.beans_position for bean in left), env.step_cnt
+        state = engine.with_beans(state._replace(beans=0), env.beans_position)
+        assert state[:4] == engine.from_env(env)[:4], env.step_cnt
+        assert engine.is_terminal(state) == env.is_terminal(), env.step_cnt
+        assert bit_reward == reward and hit == info['hit'], env.step_cnt
@@ -0,0 +1,28 @@
+# -*- coding:utf-8  -*-
+import pytest
+
+from agent.mcts.mcts_agent import mcts_snake
+from util.decision_cache import DecisionCache, cached_decisions
+
+beans = [[0, 0], [2, 5], [4, 1], [5, 6], [1, 3]]
+snakes = [[[1, 1], [1, 2], [1, 3]], [[4, 4], [4, 5], [4, 6]]]
+
+
+def test_mcts_is_not_cached():
+    with pytest.raises(Exception, match='deterministic'):
+        cached_decisions(mcts_snake, DecisionCache(1))
+
+
+def test_timed_calls_pass_through():
+    calls = []
+
+    def agent(beans, snakes, width, height, my_snake, workers=0):
+        calls.append(workers)
+        return [0]
+    agent.deterministic = lambda arguments: not arguments['workers']
+    cache = DecisionCache(1)
+    cached = cached_decisions(agent, cache)
+    for workers in (0, 0, 2, 2):
+        assert cached(beans, snakes, 8, 6, 0, workers=workers) == [0]
+    assert calls == [0, 2, 2]
+    assert (cache.hits, cache.misses) == (1, 1)
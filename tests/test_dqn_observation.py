@@ -0,0 +1,45 @@
+# -*- coding:utf-8  -*-
+import numpy as np
+import pytest
+
+from agent.dqn.observation import controlled_observations, get_observations
+from env.chooseenv import make
+
+
+def positions(seed):
+    # the env after reset(seed) and the observation of each side
+    env = make('snakes_1v1')
+    state, info = env.reset(seed=seed)
+    return env, state, info, env.get_dict_many_view(env.current_state, [0, 1])
+
+
+def seen_by(side, env, state, info, step):
+    # the training features of side's snake as snake 0
+    state = np.array(state)
+    snakes = info['snakes_position']
+    if side == 1:
+        state = np.where(state == 2, 3, np.where(state == 3, 2, state))
+        snakes = snakes[::-1]
+    info = {'beans_position': info['beans_position'], 'snakes_position': snakes}
+    return get_observations(state, info, [0], 65, env.board_height, env.board_width, step)[0]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('side', [0, 1])
+def test_controlled_observations(seed, side):
+    env, state, info, observation_list = positions(seed)
+    row = controlled_observations([observation_list[side]], 3)[0]
+    assert np.array_equal(row, seen_by(side, env, state, info, 3))
+
+
+@pytest.mark.parametrize('module', ['agent.dqn.submission', 'agent.dqn.rl_agent'])
+def test_batch_controller_plays_each_side(module):
+    if module == 'agent.dqn.rl_agent':
+        pytest.importorskip('torch')
+    controller = __import__(module, fromlist=['batch_controller'])
+    choose = controller.critic.choose_action if hasattr(controller, 'critic') else controller.agent.choose_action
+    for seed in range(5):
+        env, state, info, observation_list = positions(seed)
+        joint_actions = controller.batch_controller([[observation_list[0]], [observation_list[1]]], [0, 0])
+        for side, joint_action in enumerate(joint_actions):
+            assert joint_action == [[[int(a == choose(seen_by(side, env, state, info, 0))) for a in range(4)]]]
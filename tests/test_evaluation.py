@@ -0,0 +1,67 @@
+# -*- coding:utf-8  -*-
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def evaluate(*args):
+    # evaluation.py run as from the command line, its output
+    result = subprocess.run([sys.executable, 'evaluation.py'] + [str(a) for a in args], cwd=root,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, timeout=600)
+    assert result.returncode == 0, result.stdout
+    return result.stdout
+
+
+@pytest.mark.parametrize('my_ai, opponent, verdict', [('greedy', 'random', 'H1'), ('random', 'greedy', 'H0')])
+def test_sprt(my_ai, opponent, verdict):
+    out = evaluate('--my_ai', my_ai, '--opponent', opponent, '--episode', 200, '--sprt', '--seed', 0)
+    match = re.search(r'SPRT (\S+) accepted.* after (\d+) games', out)
+    assert match, out
+    assert match.group(1) == verdict
+    assert int(match.group(2)) < 200
+    assert 'Result base on %s episodes' % match.group(2) in out
+
+
+def test_sprt_undecided():
+    out = evaluate('--my_ai', 'greedy', '--opponent', 'random', '--episode', 3, '--sprt', '--seed', 0)
+    assert 'SPRT undecided after 3 games' in out
+
+
+def test_move_cache(tmp_path):
+    cache_file = str(tmp_path / 'moves.pkl')
+    out = evaluate('--my_ai', 'greedy', '--opponent', 'random', '--episode', 3, '--seed', 0,
+                   '--cache_mb', 1, '--cache_file', cache_file)
+    assert 'move cache:' in out
+    assert os.path.exists(cache_file)
+    out = evaluate('--my_ai', 'greedy', '--opponent', 'random', '--episode', 3, '--seed', 0,
+                   '--cache_mb', 1, '--cache_file', cache_file, '--cache_symmetric')
+    assert 'move cache:' in out
+
+
+def test_move_cache_reproduces_uncached_games(tmp_path):
+    # exact keys by default: cached greedy plays the games it plays uncached
+    cache_file = str(tmp_path / 'moves.pkl')
+    results = []
+    for cache in ([], ['--cache_mb', 1, '--cache_file', cache_file], ['--cache_mb', 1, '--cache_file', cache_file]):
+        out = evaluate('--my_ai', 'greedy', '--opponent', 'greedy', '--episode', 3, '--seed', 0, *cache)
+        results.append(out[out.index('Result base on'):out.index('move cache:') if cache else None])
+    assert results[0] == results[1] == results[2]
+    assert re.search(r'move cache: [1-9]\d* hits, 0 misses', out), out
+
+
+def test_scaling():
+    out = evaluate('--my_ai', 'greedy', '--opponent', 'random', '--episode', 2, '--scaling', '1,2',
+                   '--threads', 1, '--pin')
+    assert 'games/s' in out
+    assert len(re.findall(r'^\s+[12]\s+\d', out, re.M)) == 2
+
+
+@pytest.mark.parametrize('my_ai, opponent', [('mcts', 'random'), ('search', 'greedy')])
+def test_search_agents(my_ai, opponent):
+    out = evaluate('--my_ai', my_ai, '--opponent', opponent, '--episode', 1, '--seed', 0)
+    assert 'Result base on 1 episode:' in out
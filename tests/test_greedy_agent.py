@@ -0,0 +1,38 @@
+# -*- coding:utf-8  -*-
+import copy
+
+import numpy as np
+import pytest
+
+from agent.greedy.greedy_agent import free_neighbours, greedy_snake
+from test_greedy_batch import random_positions
+
+
+def test_free_neighbours_wrap_on_the_torus():
+    rng = np.random.RandomState(0)
+    free = rng.rand(3, 6, 8) < 0.5
+    expected = np.zeros((3, 6, 8), dtype=int)
+    for i in range(6):
+        for j in range(8):
+            for dx, dy in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+                expected[:, i, j] += free[:, (i + dx) % 6, (j + dy) % 8]
+    assert np.array_equal(free_neighbours(free, 8, 6), expected)
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_greedy_is_translation_invariant(seed):
+    # a translated position gets the same move, as canonical move-cache keys assume
+    env, positions = random_positions(seed)
+    width, height = env.board_width, env.board_height
+    rng = np.random.RandomState(seed)
+    for state, beans, snakes, step in positions:
+        for side in (0, 1):
+            dx, dy = rng.randint(height), rng.randint(width)
+
+            def move(cell):
+                return [(cell[0] + dx) % height, (cell[1] + dy) % width]
+            action = greedy_snake(state.copy(), copy.deepcopy(beans), copy.deepcopy(snakes), width, height,
+                                  [side], step)[0]
+            moved = greedy_snake(np.roll(state, (dx, dy), axis=(0, 1)), [move(c) for c in beans],
+                                 [[move(c) for c in snake] for snake in snakes], width, height, [side], step)
+            assert moved[0] == action
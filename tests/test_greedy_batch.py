@@ -0,0 +1,37 @@
+# -*- coding:utf-8  -*-
+import copy
+
+import numpy as np
+import pytest
+
+from agent.greedy.greedy_agent import greedy_snake
+from agent.greedy.greedy_batch import greedy_snake_batch
+from env.chooseenv import make
+
+
+def random_positions(seed, n_games=3):
+    # (state map, beans, snakes, step) of every step of games with random moves
+    env = make('snakes_1v1')
+    rng = np.random.RandomState(seed)
+    positions = []
+    for game in range(n_games):
+        state, info = env.reset(seed=seed * n_games + game)
+        step = 0
+        done = False
+        while not done:
+            positions.append((np.squeeze(np.array(state), axis=2), info['beans_position'],
+                              info['snakes_position'], step))
+            state, _, done, _, info = env.step(env.encode(rng.randint(4, size=2)))
+            step += 1
+    return env, positions
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('side', [0, 1])
+def test_batch_plays_greedy_snake(seed, side):
+    # the trainer's batched opponent must play the moves of greedy_snake
+    env, positions = random_positions(seed)
+    states, beans, snakes, steps = [list(p) for p in zip(*copy.deepcopy(positions))]
+    batch = greedy_snake_batch(states, beans, snakes, env.board_width, env.board_height, side, steps)
+    for (state, bean, snake, step), action in zip(copy.deepcopy(positions), batch):
+        assert greedy_snake(state, bean, snake, env.board_width, env.board_height, [side], step)[0] == action
@@ -0,0 +1,54 @@
+# -*- coding:utf-8  -*-
+import random
+import sqlite3
+
+from env.chooseenv import make
+from env.replay import ReplayRecorder
+from util.log_store import GameLogStore
+
+
+def record_game(path, seed, n_steps=None):
+    env = make('snakes_1v1')
+    env.reset(seed=seed)
+    rng = random.Random(seed)
+    recorder = ReplayRecorder(env, seed=seed)
+    done, t = False, 0
+    while not done and (n_steps is None or t < n_steps):
+        joint_action = env.encode([rng.randrange(4) for _ in range(env.n_player)])
+        _, _, done, _, info_after = env.step(joint_action)
+        recorder.record(env, joint_action, info_after)
+        t += 1
+    recorder.save(path)
+    return env
+
+
+def query(path, sql):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+
+def test_replay_winner(tmp_path):
+    for seed in range(5):
+        replay = str(tmp_path / ('%d.replay' % seed))
+        env = record_game(replay, seed)
+        db = str(tmp_path / ('%d.db' % seed))
+        store = GameLogStore(db)
+        assert store.import_replay(replay) == 1
+        store.close()
+        (winner, scores), = query(db, "SELECT winner, scores FROM games")
+        assert winner == env.check_win()
+        assert scores is not None
+
+
+def test_empty_replay_has_no_result(tmp_path):
+    replay = str(tmp_path / 'empty.replay')
+    record_game(replay, 0, n_steps=0)
+    db = str(tmp_path / 'empty.db')
+    store = GameLogStore(db)
+    assert store.import_replay(replay) == 1
+    store.close()
+    assert query(db, "SELECT n_steps, winner, scores FROM games") == [(0, None, None)]
+    assert query(db, "SELECT result FROM players") == [(None,), (None,)]
@@ -0,0 +1,47 @@
+# -*- coding:utf-8  -*-
+import copy
+import random
+
+import pytest
+
+from env.chooseenv import make
+from env.replay import Replay, ReplayRecorder
+
+
+def as_lists(positions):
+    return [[int(v) for v in pos] for pos in positions]
+
+
+@pytest.mark.parametrize('keyframe_interval', [0, 7])
+@pytest.mark.parametrize('seed', range(5))
+def test_replay_round_trip(tmp_path, seed, keyframe_interval):
+    # record a game with random (also reversing) actions, save and load it, then replay
+    # every step and compare positions, rewards and scores with what the env produced
+    env = make('snakes_1v1')
+    env.reset(seed=seed)
+    rng = random.Random(seed)
+    recorder = ReplayRecorder(env, meta={'seed': seed}, seed=seed, keyframe_interval=keyframe_interval)
+    played = []
+    done = False
+    while not done:
+        joint_action = env.encode([rng.randrange(4) for _ in range(env.n_player)])
+        _, reward, done, _, info_after = env.step(joint_action)
+        recorder.record(env, joint_action, info_after)
+        played.append((list(reward), copy.deepcopy(info_after), recorder.engine.from_env(env)))
+    path = str(tmp_path / 'game.replay')
+    recorder.save(path)
+    with open(path, 'rb') as f:
+        assert f.read() == recorder.to_bytes()
+
+    replay = Replay.load(path)
+    assert len(replay) == len(played)
+    assert replay.seed == seed and replay.meta == {'seed': seed}
+    for t, (info, (reward, info_after, state)) in enumerate(zip(replay.infos(), played)):
+        assert info['reward'] == reward, t
+        assert info['info_after']['snakes_position'] == [as_lists(s) for s in info_after['snakes_position']], t
+        assert as_lists(info['info_after']['beans_position']) == as_lists(info_after['beans_position']), t
+        assert list(info['info_after']['hit']) == list(info_after['hit']), t
+        assert info['info_after']['score'] == list(info_after['score']), t
+        frame_state, beans = replay.frame(t + 1)
+        assert (frame_state.bodies, frame_state.beans, frame_state.directions, frame_state.step_cnt) == \
+            (state.bodies, state.beans, state.directions, state.step_cnt), t
@@ -0,0 +1,69 @@
+# -*- coding:utf-8  -*-
+import random
+
+import pytest
+
+from env.bitboard_snakes import BitboardSnakes
+from env.chooseenv import make
+from env.symmetry import bits, get_symmetry
+
+
+def positions(seed, n_games=4):
+    # bitboard states of games with random non-reversing moves from seeded starts
+    env = make('snakes_1v1')
+    engine = BitboardSnakes(env.board_width, env.board_height, env.max_step, env.init_len)
+    rng = random.Random(seed)
+    states = []
+    for game in range(n_games):
+        env.reset(seed=seed * n_games + game)
+        state = engine.from_env(env)
+        while not env.is_terminal():
+            states.append(state)
+            actions = [rng.choice([a for a in range(4) if a ^ 1 != d]) for d in state.directions]
+            env.step(env.encode(actions))
+            state = engine.from_env(env)
+    return engine, states
+
+
+def transformed(engine, state, transform):
+    symmetry = get_symmetry(engine.width, engine.height)
+    bodies = [[symmetry.transform_cell(c, transform) for c in body] for body in state.bodies]
+    beans = [symmetry.transform_cell(c, transform) for c in bits(state.beans)]
+    return state._replace(bodies=tuple(tuple(body) for body in bodies),
+                          masks=tuple(engine.mask(body) for body in bodies), beans=engine.mask(beans),
+                          directions=tuple(symmetry.transform_action(d, transform) for d in state.directions))
+
+
+def transforms(width, height):
+    return [(fx, fy, dx, dy) for fx in (0, 1) for fy in (0, 1) for dx in range(height) for dy in range(width)]
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_canonical_key_is_invariant(seed):
+    engine, states = positions(seed)
+    symmetry = get_symmetry(engine.width, engine.height)
+    for state in states[::5]:
+        for seat in (0, 1):
+            key = symmetry.canonical_key(state, seat)[0]
+            for t in transforms(engine.width, engine.height):
+                assert symmetry.canonical_key(transformed(engine, state, t), seat)[0] == key
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_actions_commute_with_steps(seed):
+    # mapping the position and the actions then stepping equals stepping then mapping;
+    # regenerated snakes are placed in board order, which no transform keeps
+    engine, states = positions(seed)
+    symmetry = get_symmetry(engine.width, engine.height)
+    rng = random.Random(seed)
+    checked = 0
+    for state in states:
+        actions = [rng.randrange(4), rng.randrange(4)]
+        after, reward, hit = engine.step(state, actions)
+        if any(hit):
+            continue
+        for t in rng.sample(transforms(engine.width, engine.height), 8):
+            mapped = [symmetry.transform_action(a, t) for a in actions]
+            assert engine.step(transformed(engine, state, t), mapped) == (transformed(engine, after, t), reward, hit)
+        checked += 1
+    assert checked > 100
@@ -0,0 +1,28 @@
+# -*- coding:utf-8  -*-
+import os
+import sys
+
+from util.threads import configure_threads
+
+fake_torch = '''
+threads = []
+def set_num_threads(n):
+    threads.append(('intra', n))
+def set_num_interop_threads(n):
+    threads.append(('interop', n))
+'''
+
+
+def test_budget_reaches_lazily_imported_torch(tmp_path, monkeypatch):
+    # torch not loaded yet, as in evaluation.py before the DQN agent plays
+    (tmp_path / 'torch.py').write_text(fake_torch)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'torch', raising=False)
+    for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        monkeypatch.setenv(name, '')
+    try:
+        configure_threads(2, 1)
+        assert sys.modules['torch'].threads == [('intra', 2), ('interop', 1)]
+        assert os.environ['OMP_NUM_THREADS'] == '2'
+    finally:
+        sys.modules.pop('torch', None)
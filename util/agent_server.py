@@ -0,0 +1,135 @@
+# -*- coding:utf-8  -*-
+import importlib
+import multiprocessing
+import struct
+import traceback
+
+import numpy as np
+
+from util.discrete import Discrete
+
+# Hosts an agent's my_controller in a long-lived worker process.  The module is
+# imported once, so distance tables, loaded torch models and any state the agent
+# keeps between moves stay warm.  Observations cross the pipe in a compact binary
+# form and are rebuilt into the dict observation in the worker; the reply is one
+# action index per controlled snake.
+#
+# observation: height, width, n_snakes, controlled_snake_index, cell size in bytes,
+#              last_direction per snake (255 when unknown), n_beans, bean cells,
+#              every snake's length followed by its cells from head to tail
+# reply:       0 and one action byte per controlled snake, or 1 and the traceback
+
+directions_name = ["up", "down", "left", "right"]
+cell_type = {1: np.uint8, 2: np.uint16}
+
+
+def encode_observation(obs):
+    height, width = obs['board_height'], obs['board_width']
+    n_snakes = len([k for k in obs if isinstance(k, int) and k >= 2])
+    cell_bytes = 1 if height * width <= 256 else 2
+    last = obs.get('last_direction')
+    last = [directions_name.index(d) for d in last] if last else [255] * n_snakes
+    header = struct.pack('<BBBBB', height, width, n_snakes, obs['controlled_snake_index'], cell_bytes)
+    cells = [len(obs[1])] + [x * width + y for x, y in obs[1]]
+    for i in range(n_snakes):
+        snake = obs[i + 2]
+        cells.append(len(snake))
+        cells.extend(x * width + y for x, y in snake)
+    return header + bytes(last) + np.asarray(cells, dtype=cell_type[cell_bytes]).tobytes()
+
+
+def decode_observation(data):
+    height, width, n_snakes, controlled, cell_bytes = struct.unpack_from('<BBBBB', data)
+    last = list(data[5:5 + n_snakes])
+    cells = np.frombuffer(data, dtype=cell_type[cell_bytes], offset=5 + n_snakes).tolist()
+    state = [[[0] for _ in range(width)] for _ in range(height)]
+    obs = {}
+    pos = 0
+    for key in range(1, n_snakes + 2):
+        n = cells[pos]
+        obs[key] = [list(divmod(c, width)) for c in cells[pos + 1:pos + 1 + n]]
+        pos += n + 1
+    for key in range(2, n_snakes + 2):
+        for x, y in obs[key]:
+            state[x][y][0] = key
+    for x, y in obs[1]:
+        state[x][y][0] = 1
+    obs['state_map'] = state
+    obs['board_width'] = width
+    obs['board_height'] = height
+    obs['last_direction'] = None if 255 in last else [directions_name[d] for d in last]
+    obs['controlled_snake_index'] = controlled
+    return obs
+
+
+def pack_observations(obs_list):
+    # every observation prefixed with its length
+    data = [bytes([len(obs_list)])]
+    for obs in obs_list:
+        packed = encode_observation(obs)
+        data.append(struct.pack('<H', len(packed)) + packed)
+    return b''.join(data)
+
+
+def unpack_observations(data):
+    obs_list = []
+    pos = 1
+    for _ in range(data[0]):
+        (n,) = struct.unpack_from('<H', data, pos)
+        obs_list.append(decode_observation(data[pos + 2:pos + 2 + n]))
+        pos += n + 2
+    return obs_list
+
+
+def serve(policy, conn, is_act_continuous=False):
+    controller = importlib.import_module("agent.%s.submission" % policy).my_controller
+    while True:
+        data = conn.recv_bytes()
+        if not data:
+            break
+        try:
+            obs_list = unpack_observations(data)
+            action_space_list = [[Discrete(4)] for _ in obs_list]
+            each = controller(obs_list, action_space_list, is_act_continuous)
+            conn.send_bytes(b'\x00' + bytes(list(act[0]).index(1) for act in each))
+        except Exception:
+            conn.send_bytes(b'\x01' + traceback.format_exc().encode('utf-8'))
+    conn.close()
+
+
+class AgentServer(object):
+    """
+    my_controller of agent/<policy>/submission.py running in its own process.
+    The server is called like my_controller and returns the same one-hot actions.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve, args=(policy, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def __call__(self, observation_list, action_space_list=None, is_act_continuous=False):
+        self.conn.send_bytes(pack_observations(observation_list))
+        reply = self.conn.recv_bytes()
+        if reply[0]:
+            raise Exception("agent %s failed:\n%s" % (self.policy, reply[1:].decode('utf-8')))
+        actions = []
+        for a in reply[1:]:
+            each = [0] * 4
+            each[a] = 1
+            actions.append([each])
+        return actions
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send_bytes(b'')
+            self.process.join()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
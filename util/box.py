@@ -1,7 +1,8 @@
+import warnings
+
 import numpy as np
 
 from .space import Space
-from gym import logger
 
 
 class Box(Space):
@@ -58,7 +59,7 @@ class Box(Space):
         high_precision = _get_precision(self.high.dtype)
         dtype_precision = _get_precision(self.dtype)
         if min(low_precision, high_precision) > dtype_precision:
-            logger.warn("Box bound precision lowered by casting to {}".format(self.dtype))
+            warnings.warn("Box bound precision lowered by casting to {}".format(self.dtype))
         self.low = self.low.astype(self.dtype)
         self.high = self.high.astype(self.dtype)
 
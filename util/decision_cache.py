@@ -0,0 +1,177 @@
+# -*- coding:utf-8  -*-
+import inspect
+import os
+import pickle
+import sys
+from collections import OrderedDict
+
+from env.bitboard_snakes import BitboardSnakes
+from env.symmetry import bits, get_symmetry, hash_key
+
+# Memoized agent decisions.  Deterministic agents such as greedy_snake play the same
+# move every time a position comes back, which in self-play evaluation is often, so
+# the move is looked up in an LRU cache keyed by a hash of the position instead of
+# being searched again.  Only agents that declare themselves deterministic are cached:
+# an agent function or controller with a deterministic attribute, True or a function
+# of the call's arguments (search_snake is deterministic without worker processes).
+# Time-bounded searches such as mcts_snake find different moves on different visits
+# and are not cached, the first move found would be frozen for every later visit.
+#
+# By default the key is the exact position, so a cached run plays the moves of an
+# uncached one.  canonical=True keys the canonical position (env/symmetry.py): the
+# move is stored in the canonical frame and mapped back, so a translation or
+# reflection of a cached position also hits.  Moves can then change: an agent that is
+# not symmetric, such as greedy_snake breaking ties by direction order on a reflected
+# position, plays the cached move instead of the one it would have picked.
+#
+# The cache holds at most max_mb of entries (estimated from the sizes of the key, the
+# moves and the dict node) and can be saved to and loaded from a pickle file, so a
+# repeated benchmark run starts with the moves of the previous one.
+
+entry_overhead = 100
+identity = (0, 0, 0, 0)
+engines = {}
+
+
+class DecisionCache(object):
+    def __init__(self, max_mb=64, path=None):
+        self.max_bytes = int(max_mb * 2 ** 20)
+        self.path = path
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def entry_size(self, key, value):
+        return sys.getsizeof(key) + sys.getsizeof(value) + entry_overhead
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.bytes -= self.entry_size(key, self.entries.pop(key))
+        self.entries[key] = value
+        self.bytes += self.entry_size(key, value)
+        while self.bytes > self.max_bytes and self.entries:
+            old_key, old_value = self.entries.popitem(last=False)
+            self.bytes -= self.entry_size(old_key, old_value)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries), "evictions": self.evictions, "mb": self.bytes / 2 ** 20}
+
+    def save(self, path=None):
+        # least recently used first, so loading keeps the order
+        with open(path or self.path, 'wb') as f:
+            pickle.dump(list(self.entries.items()), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        with open(path, 'rb') as f:
+            for key, value in pickle.load(f):
+                self.put(key, value)
+
+
+def decision_key(beans, snakes, width, height, seats, extra=b'', canonical=True):
+    # (key, transform to the frame the moves are stored in) of a position seen by seats
+    if (width, height) not in engines:
+        engines[(width, height)] = BitboardSnakes(width, height)
+    symmetry = get_symmetry(width, height)
+    state = engines[(width, height)].from_observation(beans, snakes)
+    beans = bits(state.beans)
+    if canonical:
+        data, transform = symmetry.canonical(state.bodies, beans, state.directions, seats[0])
+    else:
+        data, transform = symmetry.encode(state.bodies, beans, state.directions, identity), identity
+    return hash_key(bytes([width, height]) + bytes(seats) + extra + b'|' + data), transform
+
+
+def declared_deterministic(agent):
+    deterministic = getattr(agent, 'deterministic', False)
+    if not deterministic:
+        raise Exception("%s does not declare itself deterministic, its moves cannot be cached" % agent.__name__)
+    return deterministic
+
+
+def cached_decisions(agent, cache, canonical=False):
+    """
+    Wraps an agent function with the arguments of search_snake or greedy_snake
+    (beans, snakes, width, height, the seat as my_snake or ctrl_agent_index,
+    anything else) that returns the moves of its snakes.  Arguments other than the
+    position (the step, time budgets, ...) are part of the key.  Calls the agent does
+    not declare deterministic for are passed through.
+    """
+    deterministic = declared_deterministic(agent)
+    signature = inspect.signature(agent)
+    position_args = ('state', 'state_map', 'beans', 'snakes', 'width', 'height', 'my_snake', 'ctrl_agent_index')
+
+    def cached_agent(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = bound.arguments
+        if deterministic is not True and not deterministic(arguments):
+            return agent(*args, **kwargs)
+        seats = arguments.get('ctrl_agent_index', None)
+        seats = list(seats) if seats is not None else [arguments['my_snake']]
+        extra = repr(sorted((k, v) for k, v in arguments.items() if k not in position_args)).encode()
+        key, transform = decision_key(arguments['beans'], arguments['snakes'], arguments['width'],
+                                      arguments['height'], seats, extra, canonical)
+        symmetry = get_symmetry(arguments['width'], arguments['height'])
+        moves = cache.get(key)
+        if moves is None:
+            result = [int(a) for a in agent(*args, **kwargs)]
+            cache.put(key, tuple(symmetry.transform_action(a, transform) for a in result))
+            return result
+        return [symmetry.transform_action(a, transform) for a in moves]
+    return cached_agent
+
+
+def cached_controller(controller, cache, canonical=False):
+    """
+    Wraps a submission's my_controller.  The step is counted here as the submissions
+    count it, per seat from the first move of a game, and is part of the key; on a hit
+    the wrapped module's current_steps, when it keeps them, are advanced as if it had
+    been called.
+    """
+    declared_deterministic(controller)
+    current_steps = {}
+
+    def my_controller(observation_list, action_space_list, is_act_continuous=False):
+        obs = observation_list[0]
+        width, height = obs['board_width'], obs['board_height']
+        snakes = [obs[k] for k in sorted(k for k in obs if isinstance(k, int) and k >= 2)]
+        seats = [o['controlled_snake_index'] for o in observation_list]
+        if obs.get('last_direction') is None:
+            current_steps[seats[0]] = 0
+        step = current_steps.get(seats[0], 0)
+        current_steps[seats[0]] = step + 1
+        key, transform = decision_key(obs[1], snakes, width, height, seats, b'%d' % step, canonical)
+        symmetry = get_symmetry(width, height)
+        moves = cache.get(key)
+        if moves is None:
+            joint_action = controller(observation_list, action_space_list, is_act_continuous)
+            if isinstance(joint_action, list):
+                moves = [each[0].index(1) for each in joint_action]
+                cache.put(key, tuple(symmetry.transform_action(a, transform) for a in moves))
+            return joint_action
+        steps = controller.__globals__.get('current_steps')
+        if isinstance(steps, dict):
+            steps[seats[0]] = step + 1
+        joint_action = []
+        for a in moves:
+            each = [0] * 4
+            each[symmetry.transform_action(a, transform)] = 1
+            joint_action.append([each])
+        return joint_action
+    return my_controller
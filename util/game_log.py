@@ -0,0 +1,148 @@
+# -*- coding:utf-8  -*-
+import gzip
+import json
+import zlib
+
+import numpy as np
+
+from env.replay import ReplayRecorder
+
+# Streaming game logs.  Every step is written when it is played instead of keeping
+# the whole game in memory, and the stream is flushed every flush_every steps, so a
+# crashed or interrupted game still leaves a readable log of the steps played.
+#
+# jsonl:  one JSON object per line: {"type": "game", ...game info}, one
+#         {"type": "step", ...} per step as run_log records it, {"type": "end", ...result}
+# replay: the compact binary record of env/replay.py
+#
+# compression: None, "gzip" or "zstd" (needs the zstandard package).
+
+
+class NpEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.integer):
+            return int(obj)
+        elif isinstance(obj, np.floating):
+            return float(obj)
+        elif isinstance(obj, np.ndarray):
+            return obj.tolist()
+        else:
+            return super(NpEncoder, self).default(obj)
+
+
+suffix = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def open_stream(path, mode='wb', compression=None, buffer_size=1 << 16):
+    if compression is None:
+        return open(path, mode, buffering=buffer_size)
+    if compression == 'gzip':
+        return gzip.open(path, mode)
+    if compression == 'zstd':
+        import zstandard
+        raw = open(path, mode, buffering=buffer_size)
+        if 'w' in mode:
+            return zstandard.ZstdCompressor().stream_writer(raw)
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+    raise Exception("compression must be one of %s, got %s" % (str(list(suffix)), compression))
+
+
+def compression_of(path):
+    if path.endswith('.gz'):
+        return 'gzip'
+    if path.endswith('.zst'):
+        return 'zstd'
+    return None
+
+
+class GameLogWriter(object):
+    """
+    start(env, game_info) after env.reset(), step(env, joint_action, step_info) after
+    every env.step and finish(result) at the end. path gets the compression suffix.
+    """
+
+    def __init__(self, path, fmt='jsonl', compression=None, flush_every=1, keyframe_interval=0):
+        if fmt not in ('jsonl', 'replay'):
+            raise Exception("log format must be jsonl or replay, got %s" % fmt)
+        self.path = path + suffix[compression]
+        self.fmt = fmt
+        self.compression = compression
+        self.flush_every = flush_every
+        self.keyframe_interval = keyframe_interval
+        self.out = open_stream(self.path, 'wb', compression)
+        self.recorder = None
+        self.n_steps = 0
+
+    def write_line(self, obj):
+        self.out.write(json.dumps(obj, ensure_ascii=False, cls=NpEncoder).encode('utf-8') + b'\n')
+
+    def start(self, env, game_info):
+        if self.fmt == 'jsonl':
+            self.write_line(dict(type='game', **game_info))
+        else:
+            meta = json.loads(json.dumps(game_info, cls=NpEncoder))
+            self.recorder = ReplayRecorder(env, meta=meta, keyframe_interval=self.keyframe_interval, out=self.out)
+        self.flush()
+
+    def step(self, env, joint_action, step_info):
+        if self.fmt == 'jsonl':
+            self.write_line(dict(type='step', **step_info))
+        else:
+            self.recorder.record(env, joint_action, step_info['info_after'])
+        self.n_steps += 1
+        if self.flush_every and self.n_steps % self.flush_every == 0:
+            self.flush()
+
+    def finish(self, result):
+        # the replay format rebuilds the result from the steps
+        if self.fmt == 'jsonl':
+            self.write_line(dict(type='end', **result))
+        self.close()
+
+    def flush(self):
+        # a sync flush: everything written so far can be decompressed
+        if self.compression == 'zstd':
+            import zstandard
+            self.out.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self.out.flush()
+
+    def close(self):
+        if not self.out.closed:
+            self.out.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_game_log(path):
+    """
+    A JSON Lines log as the dict run_log writes: game info, "steps" and the result.
+    Lines cut off by a crash are skipped; "finished" tells whether the end line was reached.
+    """
+    game_info = {"steps": [], "finished": False}
+    for line in read_log_bytes(path).decode('utf-8', errors='ignore').splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            break
+        kind = record.pop('type', None)
+        if kind == 'step':
+            game_info["steps"].append(record)
+        else:
+            game_info.update(record)
+            game_info["finished"] = game_info["finished"] or kind == 'end'
+    return game_info
+
+
+def read_log_bytes(path):
+    # everything that can be decoded, also from a stream that was never closed
+    compression = compression_of(path)
+    if compression == 'gzip':
+        with open(path, 'rb') as f:
+            return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(f.read())
+    with open_stream(path, 'rb', compression) as f:
+        return f.read()
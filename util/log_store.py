@@ -0,0 +1,243 @@
+# -*- coding:utf-8  -*-
+import argparse
+import glob
+import json
+import os
+import sqlite3
+
+from env.bitboard_snakes import BitboardSnakes
+from env.replay import Replay
+from env.symmetry import get_symmetry
+from util.game_log import read_game_log, read_log_bytes
+
+# Indexed store for recorded games, so that questions such as "games agent X lost
+# after step 40" or "all head-on collisions" are SQL queries instead of scans over
+# every log file.  Imports the JSON logs of run_log (one game per line), the JSON
+# Lines logs of util/game_log.py and binary replays.
+#
+# games:   one row per game with its board, length, winner and scores
+# players: one row per seat with the policy, final score and win / draw / loss
+# steps:   rewards, directions and positions of every step
+# events:  eat, hit, respawn and head_on per step and seat, with the cell
+# positions: the canonical key (env/symmetry.py) of the first position and the one after
+#          every step, equal for positions that are translations or reflections of each
+#          other, so repeated positions across games are a GROUP BY key
+#
+# JSON logs do not say where a dead snake moved: its hit is placed on its last head
+# and head_on means two snakes hit in the same step whose heads were at most two
+# cells apart.  Replays hold the actions and give the exact cells.
+
+schema = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY, source TEXT, line INTEGER, game_name TEXT, n_player INTEGER,
+    board_height INTEGER, board_width INTEGER, start_time TEXT, end_time TEXT,
+    n_steps INTEGER, winner INTEGER, scores TEXT, UNIQUE (source, line));
+CREATE TABLE IF NOT EXISTS players (
+    game_id INTEGER, seat INTEGER, policy TEXT, score INTEGER, result TEXT,
+    PRIMARY KEY (game_id, seat));
+CREATE TABLE IF NOT EXISTS steps (
+    game_id INTEGER, step INTEGER, rewards TEXT, directions TEXT,
+    snakes_position TEXT, beans_position TEXT, PRIMARY KEY (game_id, step));
+CREATE TABLE IF NOT EXISTS events (
+    game_id INTEGER, step INTEGER, seat INTEGER, kind TEXT, x INTEGER, y INTEGER);
+CREATE TABLE IF NOT EXISTS positions (
+    game_id INTEGER, step INTEGER, key INTEGER, PRIMARY KEY (game_id, step));
+CREATE INDEX IF NOT EXISTS players_policy ON players (policy, result);
+CREATE INDEX IF NOT EXISTS events_kind ON events (kind, step);
+CREATE INDEX IF NOT EXISTS events_game ON events (game_id, step);
+CREATE INDEX IF NOT EXISTS positions_key ON positions (key);
+"""
+
+
+def torus_distance(a, b, height, width):
+    dx = abs(a[0] - b[0]) % height
+    dy = abs(a[1] - b[1]) % width
+    return min(dx, height - dx) + min(dy, width - dy)
+
+
+def step_events(step, reward, info_after, prev_snakes, height, width, heads=None):
+    # heads: where every snake moved before respawning, when known
+    events = []
+    hit = info_after.get("hit", [0] * len(reward))
+    snakes = info_after["snakes_position"]
+    for i in range(len(reward)):
+        if hit[i]:
+            head = heads[i] if heads else prev_snakes[i][0]
+            events.append((step, i, "hit", head[0], head[1]))
+            events.append((step, i, "respawn", snakes[i][0][0], snakes[i][0][1]))
+        elif reward[i] > 0:
+            events.append((step, i, "eat", snakes[i][0][0], snakes[i][0][1]))
+    dead = [i for i in range(len(reward)) if hit[i]]
+    for i in dead:
+        for j in dead:
+            if i == j:
+                continue
+            if heads:
+                head_on = heads[i] == heads[j] or (heads[i] == prev_snakes[j][0] and heads[j] == prev_snakes[i][0])
+            else:
+                head_on = torus_distance(prev_snakes[i][0], prev_snakes[j][0], height, width) <= 2
+            if head_on:
+                head = heads[i] if heads else prev_snakes[i][0]
+                events.append((step, i, "head_on", head[0], head[1]))
+                break
+    return events
+
+
+def position_key(engine, snakes, beans, step):
+    # the canonical key as a signed 64-bit SQLite integer
+    state = engine.from_observation(beans, snakes, step_cnt=step)
+    key = get_symmetry(engine.width, engine.height).canonical_key(state)[0]
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+def results(scores):
+    best = max(scores)
+    n_best = scores.count(best)
+    return ["loss" if s < best else ("win" if n_best == 1 else "draw") for s in scores]
+
+
+class GameLogStore(object):
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(schema)
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def add_game(self, game, source=None, line=0, heads=None):
+        """
+        game: the dict run_log logs (game info, "steps" and the result). heads, if given,
+        holds every step's pre-respawn head cells. Returns the game id, None if the
+        source line was imported before.
+        """
+        init = game["init_info"]
+        steps = game["steps"]
+        height, width = game["board_height"], game["board_width"]
+        # a game without steps has no result
+        scores = game.get("n_return") or (steps[-1]["info_after"]["score"] if steps else None)
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO games (source, line, game_name, n_player, board_height, board_width, "
+            "start_time, end_time, n_steps, winner, scores) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (source, line, game.get("game_name"), game["n_player"], height, width, game.get("start_time"),
+             game.get("end_time"), len(steps), game.get("winner"), None if scores is None else json.dumps(scores)))
+        if not cur.rowcount:
+            return None
+        game_id = cur.lastrowid
+        policies = game.get("policies", [])
+        if scores is None:
+            player_rows = [(game_id, i, policies[i] if i < len(policies) else None, None, None)
+                           for i in range(game["n_player"])]
+        else:
+            player_rows = [(game_id, i, policies[i] if i < len(policies) else None, score, result)
+                           for i, (score, result) in enumerate(zip(scores, results(scores)))]
+        self.db.executemany("INSERT INTO players VALUES (?, ?, ?, ?, ?)", player_rows)
+        prev_snakes = init["snakes_position"]
+        engine = BitboardSnakes(width, height)
+        step_rows, event_rows = [], []
+        position_rows = [(game_id, 0, position_key(engine, prev_snakes, init["beans_position"], 1))]
+        for t, step in enumerate(steps):
+            info_after = step.get("info_after", {})
+            directions = step.get("info_before", {}).get("directions")
+            step_rows.append((game_id, t + 1, json.dumps(step.get("reward")), json.dumps(directions),
+                              json.dumps(info_after.get("snakes_position")),
+                              json.dumps(info_after.get("beans_position"))))
+            if "snakes_position" in info_after:
+                for event in step_events(t + 1, step["reward"], info_after, prev_snakes,
+                                         height, width, heads[t] if heads else None):
+                    event_rows.append((game_id,) + event)
+                position_rows.append((game_id, t + 1, position_key(
+                    engine, info_after["snakes_position"], info_after["beans_position"], t + 2)))
+                prev_snakes = info_after["snakes_position"]
+        self.db.executemany("INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?, ?)", step_rows)
+        self.db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", event_rows)
+        self.db.executemany("INSERT OR REPLACE INTO positions VALUES (?, ?, ?)", position_rows)
+        return game_id
+
+    def import_json_log(self, path):
+        # run_log JSON logs: one game per line, console noise and cut lines are skipped
+        n = 0
+        with open(path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f):
+                try:
+                    game = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(game, dict) and "steps" in game and self.add_game(game, path, line_no) is not None:
+                    n += 1
+        return n
+
+    def import_jsonl_log(self, path):
+        return int(self.add_game(read_game_log(path), path) is not None)
+
+    def import_replay(self, path):
+        replay = Replay(read_log_bytes(path))
+        engine = replay.engine
+        game = dict(replay.meta)
+        game.setdefault("n_player", replay.n_snakes)
+        game.setdefault("board_height", replay.height)
+        game.setdefault("board_width", replay.width)
+        game["init_info"] = replay.positions(replay.initial)
+        game["steps"] = list(replay.infos())
+        if game["steps"] and game.get("winner") is None:
+            # as the env's check_win: the first snake with the highest score, numbered from 2
+            scores = game["steps"][-1]["info_after"]["score"]
+            game["winner"] = scores.index(max(scores)) + 2
+        # the exact cell every snake moved to, before respawning
+        heads = []
+        frame = replay.initial
+        for t in range(len(replay)):
+            state = frame[0]
+            actions = [a if a ^ 1 != d else d for a, d in zip(replay.steps[t][0], state.directions)]
+            heads.append([list(divmod(engine.neighbours[body[0]][a], replay.width))
+                          for body, a in zip(state.bodies, actions)])
+            frame = replay.advance(frame, t)[0]
+        return int(self.add_game(game, path, heads=heads) is not None)
+
+    def import_paths(self, paths):
+        n = 0
+        for path in paths:
+            name = path[:-len(os.path.splitext(path)[1])] if path.endswith(('.gz', '.zst')) else path
+            if name.endswith('.replay'):
+                n += self.import_replay(path)
+            elif name.endswith('.jsonl'):
+                n += self.import_jsonl_log(path)
+            elif name.endswith('.json'):
+                n += self.import_json_log(path)
+        self.db.commit()
+        return n
+
+    def query(self, sql, params=()):
+        return self.db.execute(sql, params).fetchall()
+
+    def lost_games(self, policy, min_steps=0):
+        # ids of games the policy lost that lasted more than min_steps steps
+        return [row[0] for row in self.query(
+            "SELECT games.id FROM games JOIN players ON players.game_id = games.id "
+            "WHERE players.policy = ? AND players.result = 'loss' AND games.n_steps > ?", (policy, min_steps))]
+
+    def events(self, kind, policy=None):
+        # (game id, step, seat, x, y) of every event of a kind, optionally for one policy's seats
+        if policy is None:
+            return self.query("SELECT game_id, step, seat, x, y FROM events WHERE kind = ?", (kind,))
+        return self.query(
+            "SELECT events.game_id, step, events.seat, x, y FROM events JOIN players "
+            "ON players.game_id = events.game_id AND players.seat = events.seat "
+            "WHERE kind = ? AND players.policy = ?", (kind, policy))
+
+    def repeated_positions(self, min_games=2):
+        # (key, games, occurrences) of positions reached in at least min_games games, up to symmetry
+        return self.query(
+            "SELECT key, COUNT(DISTINCT game_id) AS n, COUNT(*) FROM positions GROUP BY key "
+            "HAVING n >= ? ORDER BY n DESC", (min_games,))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="*", default=["logs/*"], help="log files or glob patterns to import")
+    parser.add_argument("--db", default="logs/games.sqlite")
+    args = parser.parse_args()
+    store = GameLogStore(args.db)
+    paths = sorted(p for pattern in args.paths for p in glob.glob(pattern) if not p.endswith('.sqlite'))
+    print("imported %d games" % store.import_paths(paths))
+    store.close()
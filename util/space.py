@@ -1,4 +1,4 @@
-from gym.utils import seeding
+import numpy as np
 
 
 class Space(object):
@@ -16,7 +16,6 @@ class Space(object):
     not handle custom spaces properly. Use custom spaces with care.
     """
     def __init__(self, shape=None, dtype=None):
-        import numpy as np  # takes about 300-400ms to import, so we load lazily
         self.shape = None if shape is None else tuple(shape)
         self.dtype = None if dtype is None else np.dtype(dtype)
         self._np_random = None
@@ -38,7 +37,9 @@ class Space(object):
 
     def seed(self, seed=None):
         """Seed the PRNG of this space. """
-        self._np_random, seed = seeding.np_random(seed)
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1)[0])
+        self._np_random = np.random.RandomState(seed)
         return [seed]
 
     def contains(self, x):
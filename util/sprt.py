@@ -0,0 +1,66 @@
+# -*- coding:utf-8  -*-
+import math
+from statistics import NormalDist
+
+# Sequential probability ratio test on match results, to stop an agent comparison
+# as soon as the result is clear instead of after a fixed number of games.  A game
+# scores 1 for a win, 0.5 for a draw and 0 for a loss; H0 says the expected score
+# is p0, H1 that it is p1.  The log likelihood ratio uses the normal approximation
+# of the mean score (as chess engine testing does), with a variance from the counts
+# plus half a game of every result, so that a run of wins does not divide by zero:
+#
+#   LLR = n (p1 - p0) (2 mean - p0 - p1) / (2 var)
+#
+# H1 is accepted once LLR >= log((1 - beta) / alpha), H0 once LLR <= log(beta / (1 - alpha));
+# alpha and beta are the probabilities of accepting the wrong one.
+
+
+class SPRT(object):
+    def __init__(self, p0=0.5, p1=0.55, alpha=0.05, beta=0.05, min_games=10, confidence=0.95):
+        if not 0 < p0 < p1 < 1:
+            raise Exception("SPRT needs 0 < p0 < p1 < 1, got %s and %s" % (p0, p1))
+        self.p0, self.p1 = p0, p1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.min_games = min_games
+        self.confidence = confidence
+        # wins, draws, losses
+        self.counts = [0, 0, 0]
+
+    def add(self, score):
+        self.counts[{1: 0, 0.5: 1, 0: 2}[score]] += 1
+
+    @property
+    def games(self):
+        return sum(self.counts)
+
+    def score(self):
+        # (mean, variance per game) of the score
+        n = self.games
+        mean = (self.counts[0] + 0.5 * self.counts[1]) / n if n else 0.5
+        w, d, l = [(c + 0.5) / (n + 1.5) for c in self.counts]
+        prior_mean = w + 0.5 * d
+        var = w * (1 - prior_mean) ** 2 + d * (0.5 - prior_mean) ** 2 + l * prior_mean ** 2
+        return mean, var
+
+    def llr(self):
+        mean, var = self.score()
+        return self.games * (self.p1 - self.p0) * (2 * mean - self.p0 - self.p1) / (2 * var)
+
+    def status(self):
+        # 'H1', 'H0' or None while undecided
+        if self.games < self.min_games:
+            return None
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+    def interval(self, confidence=None):
+        # normal confidence interval of the expected score
+        confidence = confidence or self.confidence
+        mean, var = self.score()
+        half = NormalDist().inv_cdf(0.5 + confidence / 2) * math.sqrt(var / max(self.games, 1))
+        return max(mean - half, 0.0), min(mean + half, 1.0)
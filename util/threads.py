@@ -0,0 +1,101 @@
+# -*- coding:utf-8  -*-
+import multiprocessing
+import os
+import sys
+import time
+
+# Thread budgets and CPU pinning for trainers and evaluation workers sharing a box.
+# Without a budget every process's torch (and OpenMP / MKL under numpy) starts one
+# thread per core and several processes thrash each other.  The thread counts are
+# also put into the environment so that libraries loaded later and child processes
+# pick them up.  Pinning uses sched_setaffinity and is skipped where it does not exist.
+
+thread_variables = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"]
+
+
+def parse_cpus(cpus):
+    # "0-3,6" -> [0, 1, 2, 3, 6]
+    if not cpus:
+        return None
+    result = []
+    for part in str(cpus).split(','):
+        if '-' in part:
+            lo, hi = part.split('-')
+            result.extend(range(int(lo), int(hi) + 1))
+        else:
+            result.append(int(part))
+    return result
+
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpus(worker, threads, cpus=None):
+    # the cpus of the worker-th process when each gets threads of them, wrapping around
+    cpus = cpus or available_cpus()
+    return [cpus[(worker * threads + k) % len(cpus)] for k in range(threads)]
+
+
+def configure_threads(num_threads=None, interop_threads=None, cpus=None):
+    """
+    Sets the thread budget of this process and pins it to cpus (a list or "0-3,6").
+    Call it before any work: torch only accepts interop threads before its first
+    parallel region.
+    """
+    cpus = parse_cpus(cpus) if isinstance(cpus, str) else cpus
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    if num_threads:
+        for name in thread_variables:
+            os.environ[name] = str(num_threads)
+    # the agents import torch lazily, after the budget is set, so it is imported here
+    # when a budget asks for it; without torch installed the variables above suffice
+    torch = sys.modules.get('torch')
+    if torch is None and (num_threads or interop_threads):
+        try:
+            import torch
+        except ImportError:
+            torch = None
+    if torch is not None:
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        if interop_threads:
+            try:
+                torch.set_num_interop_threads(interop_threads)
+            except RuntimeError:
+                print("interop threads can only be set before torch runs parallel work")
+
+
+def run_worker(target, args, worker, threads, interop_threads, cpus, pin, queue):
+    configure_threads(threads, interop_threads, worker_cpus(worker, threads, cpus) if pin else None)
+    start = time.perf_counter()
+    count = target(*args)
+    queue.put((count, time.perf_counter() - start))
+
+
+def scaling_curve(target, args, process_counts, threads=1, interop_threads=1, cpus=None, pin=False):
+    """
+    Runs target(*args) in 1, 2, ... processes at once for every count of process_counts
+    and measures the throughput. target returns the units of work it did (games, steps).
+    Returns rows of processes, units per second, speedup over the first count and
+    efficiency per process.
+    """
+    rows = []
+    for n in process_counts:
+        queue = multiprocessing.Queue()
+        start = time.perf_counter()
+        processes = [multiprocessing.Process(target=run_worker, args=(
+            target, args, k, threads, interop_threads, cpus, pin, queue)) for k in range(n)]
+        for p in processes:
+            p.start()
+        results = [queue.get() for _ in processes]
+        for p in processes:
+            p.join()
+        wall = time.perf_counter() - start
+        throughput = sum(count for count, _ in results) / wall
+        first_n, first = (rows[0][0], rows[0][1]) if rows else (n, throughput)
+        rows.append([n, throughput, throughput / first, throughput * first_n / (first * n)])
+    return rows